@@ -0,0 +1,296 @@
+"""Benchmark every endpoint against the Firestore emulator.
+
+Seeds the emulator with a synthetic epics × stories × tasks hierarchy, then
+calls each handler of functions/main.py in-process through its firebase
+functions wrapper. Reports latency percentiles, Firestore documents read and
+written per request (from the instrumentation counters) and the memory
+high-water mark of a single request. Results can be saved as a baseline and
+compared against later runs.
+
+    firebase emulators:start --only firestore,auth --project demo-benchmarks
+    export FIRESTORE_EMULATOR_HOST=127.0.0.1:8080
+    export FIREBASE_AUTH_EMULATOR_HOST=127.0.0.1:9099   # for get_uid
+
+    python benchmarks/run.py --save main               # write baselines/main.json
+    python benchmarks/run.py --compare main            # exit 1 on regressions
+    python benchmarks/run.py --only get_tasks --epics 50 --iterations 200
+
+The emulator database is cleared before seeding, so the script refuses to run
+without FIRESTORE_EMULATOR_HOST.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINES_PATH = os.path.join(ROOT, "benchmarks", "baselines")
+sys.path.insert(0, os.path.join(ROOT, "functions"))
+
+from scenarios import SCENARIOS  # noqa: E402
+from seed import clear_emulator, seed, seed_auth_users  # noqa: E402
+
+DEFAULT_PROJECT = "demo-benchmarks"
+# Per-request counters that must not grow between a baseline and a run
+EXACT_METRICS = ("reads", "writes", "queries")
+
+
+def init_app(project: str) -> None:
+    # The emulator accepts any credentials, so skip application default
+    # credentials lookup. db.get_app() picks this app up
+    import firebase_admin
+    from firebase_admin import credentials
+    from google.auth.credentials import AnonymousCredentials
+
+    class EmulatorCredential(credentials.Base):
+        def get_credential(self):
+            return AnonymousCredentials()
+
+    firebase_admin.initialize_app(EmulatorCredential(), {"projectId": project})
+
+
+def invoke(app, handler, method: str, args: dict = None, body=None) -> int:
+    # Run one request through the handler and return the response size in
+    # bytes. Streamed bodies are consumed so their reads are timed too
+    import flask
+    from firebase_functions import https_fn
+
+    with app.test_request_context(
+        "/", method=method, query_string=args or {}, json=body
+    ):
+        try:
+            result = handler(flask.request._get_current_object())
+        except https_fn.HttpsError as e:
+            raise RuntimeError(f"{e.code}: {e.message}") from e
+        if isinstance(result, flask.Response):
+            if result.status_code >= 400:
+                raise RuntimeError(result.get_data(as_text=True))
+            # Callable endpoints wrap their return value in {"result": ...}
+            payload = result.get_json(silent=True) if result.is_json else None
+            check_items(payload.get("result") if isinstance(payload, dict) else None)
+            return len(result.get_data())
+        check_items(result)
+        return len(json.dumps(result, default=str))
+
+
+def check_items(result) -> None:
+    # Bulk endpoints answer 200 with one result per item, so a call with
+    # failed items counts as an error
+    if not isinstance(result, dict):
+        return
+    failed = [item for item in result.get("results", []) if item.get("status") != "ok"]
+    if failed:
+        raise RuntimeError(
+            f"{len(failed)} of {len(result['results'])} items failed: "
+            f"{failed[0].get('error')}"
+        )
+
+
+def run_scenario(app, scenario, dataset, iterations: int, cold: bool) -> dict:
+    import main
+    from cache import entity_cache
+    from instrumentation import capture
+
+    handler = getattr(main, scenario.handler)
+    latencies = []
+    totals = dict.fromkeys(EXACT_METRICS + ("bytes",), 0)
+    errors = []
+    for i in range(iterations):
+        request = scenario.request(dataset, i)
+        if cold:
+            entity_cache.clear()
+        with capture(scenario.name) as trace:
+            started = time.perf_counter()
+            try:
+                size = invoke(app, handler, **request)
+            except Exception as e:
+                errors.append(str(e))
+                continue
+            latencies.append((time.perf_counter() - started) * 1000)
+        totals["bytes"] += size
+        for metric in EXACT_METRICS:
+            totals[metric] += trace.counts[metric]
+
+    # Memory is measured on one extra request, outside the timed loop, since
+    # tracemalloc slows allocation down considerably
+    tracemalloc.start()
+    try:
+        invoke(app, handler, **scenario.request(dataset, iterations))
+    except Exception:
+        pass
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    ok = len(latencies)
+    result = {
+        "calls": iterations,
+        "errors": len(errors),
+        **percentiles(latencies),
+        **{
+            metric: round(total / ok, 2) if ok else None
+            for metric, total in totals.items()
+        },
+        "peak_kb": round(peak / 1024, 1),
+    }
+    if errors:
+        result["first_error"] = errors[0][:200]
+    return result
+
+
+def percentiles(latencies: list) -> dict:
+    if len(latencies) < 2:
+        value = round(latencies[0], 2) if latencies else None
+        return {"p50_ms": value, "p95_ms": value, "p99_ms": value}
+    cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+    return {
+        "p50_ms": round(cuts[49], 2),
+        "p95_ms": round(cuts[94], 2),
+        "p99_ms": round(cuts[98], 2),
+    }
+
+
+def print_table(results: dict, baseline: dict = None) -> None:
+    columns = ("p50_ms", "p95_ms", "p99_ms", "reads", "writes", "queries", "peak_kb")
+    print(f"{'scenario':<28}" + "".join(f"{column:>12}" for column in columns))
+    for name, result in results.items():
+        before = (baseline or {}).get(name, {})
+        cells = []
+        for column in columns:
+            value = result.get(column)
+            cell = "-" if value is None else f"{value:g}"
+            if before.get(column) not in (None, 0) and value is not None:
+                change = (value - before[column]) / before[column] * 100
+                cell += f" {change:+.0f}%"
+            cells.append(f"{cell:>12}")
+        errors = f"  ({result['errors']} errors)" if result["errors"] else ""
+        print(f"{name:<28}" + "".join(cells) + errors)
+
+
+def regressions(results: dict, baseline: dict, tolerance: float) -> list:
+    # Firestore usage must not grow at all; p95 latency may drift by tolerance
+    found = []
+    for name, result in results.items():
+        before = baseline.get(name)
+        if not before:
+            continue
+        for metric in EXACT_METRICS:
+            if (result.get(metric) or 0) > (before.get(metric) or 0):
+                found.append(f"{name}: {metric} {before[metric]} -> {result[metric]}")
+        if (
+            result.get("p95_ms") is not None
+            and before.get("p95_ms")
+            and result["p95_ms"] > before["p95_ms"] * (1 + tolerance)
+        ):
+            found.append(f"{name}: p95 {before['p95_ms']} ms -> {result['p95_ms']} ms")
+        if result["errors"] > before.get("errors", 0):
+            found.append(f"{name}: {result['errors']} errors")
+    return found
+
+
+def baseline_path(name: str) -> str:
+    return os.path.join(BASELINES_PATH, f"{name}.json")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--epics", type=int, default=10)
+    parser.add_argument("--stories", type=int, default=10, help="per epic")
+    parser.add_argument("--tasks", type=int, default=10, help="per story")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--only", nargs="+", help="scenarios or handlers to run")
+    parser.add_argument(
+        "--cold", action="store_true", help="clear the entity cache before each call"
+    )
+    parser.add_argument("--save", metavar="NAME", help="save results as a baseline")
+    parser.add_argument("--compare", metavar="NAME", help="compare with a baseline")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.25,
+        help="allowed p95 slowdown against the baseline (default 0.25)",
+    )
+    args = parser.parse_args()
+
+    if not os.environ.get("FIRESTORE_EMULATOR_HOST"):
+        print("FIRESTORE_EMULATOR_HOST is not set; refusing to clear a real database")
+        return 2
+    project = os.environ.setdefault("GOOGLE_CLOUD_PROJECT", DEFAULT_PROJECT)
+    # Traces are captured per request, never logged
+    os.environ["INSTRUMENTATION_SAMPLE_RATE"] = "0"
+
+    import flask
+
+    init_app(project)
+    clear_emulator(project)
+    dimensions = {
+        "epics": args.epics,
+        "stories": args.stories,
+        "tasks": args.tasks,
+        "users": args.users,
+    }
+    started = time.perf_counter()
+    dataset = seed(args.epics, args.stories, args.tasks, args.users)
+    print(
+        f"Seeded {len(dataset.epics)} epics, {len(dataset.stories)} stories and "
+        f"{len(dataset.tasks)} tasks in {time.perf_counter() - started:.1f} s"
+    )
+
+    scenarios = [
+        scenario
+        for scenario in SCENARIOS
+        if not args.only or {scenario.name, scenario.handler} & set(args.only)
+    ]
+    if any(scenario.requires for scenario in scenarios) and os.environ.get(
+        "FIREBASE_AUTH_EMULATOR_HOST"
+    ):
+        seed_auth_users(dataset)
+
+    app = flask.Flask("benchmarks")
+    results = {}
+    for scenario in scenarios:
+        if scenario.requires and not os.environ.get(scenario.requires):
+            print(f"Skipping {scenario.name}: {scenario.requires} is not set")
+            continue
+        results[scenario.name] = run_scenario(
+            app, scenario, dataset, args.iterations, args.cold
+        )
+
+    baseline = None
+    if args.compare:
+        with open(baseline_path(args.compare)) as f:
+            baseline = json.load(f)
+        if baseline["dataset"] != dimensions:
+            print(f"Warning: baseline was taken with {baseline['dataset']}")
+    print_table(results, baseline and baseline["results"])
+
+    if args.save:
+        os.makedirs(BASELINES_PATH, exist_ok=True)
+        with open(baseline_path(args.save), "w") as f:
+            json.dump(
+                {
+                    "dataset": dimensions,
+                    "iterations": args.iterations,
+                    "cold": args.cold,
+                    "results": results,
+                },
+                f,
+                indent=2,
+            )
+            f.write("\n")
+        print(f"Saved baseline to {baseline_path(args.save)}")
+
+    if baseline:
+        found = regressions(results, baseline["results"], args.tolerance)
+        for regression in found:
+            print(f"Regression: {regression}")
+        return 1 if found else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,221 @@
+"""One benchmark scenario per endpoint of functions/main.py.
+
+A scenario names the handler it drives and builds the request for iteration i
+of a run from the seeded dataset. Read scenarios come first so that they always
+see the freshly seeded data; the write scenarios after them add or change
+documents.
+"""
+
+from typing import Callable, NamedTuple
+
+from seed import STATUSES, Dataset
+
+# Items per bulk call
+BULK_SIZE = 100
+
+
+class Scenario(NamedTuple):
+    name: str
+    handler: str
+    # (dataset, iteration) -> {"method", "args", "body"}
+    request: Callable[[Dataset, int], dict]
+    # Environment variable the scenario needs, e.g. an emulator host
+    requires: str = None
+
+
+def get(args: dict) -> dict:
+    return {"method": "GET", "args": args}
+
+
+def call(data) -> dict:
+    # Callable functions take a POST with the payload under "data"
+    return {"method": "POST", "body": {"data": data}}
+
+
+def new_item(kind: str, i: int, **fields) -> dict:
+    return {
+        "name": f"new {kind} {i}",
+        "description": f"Benchmark {kind}",
+        "creator_id": "bench-user-0",
+        "assigned_user_id": "bench-user-1",
+        "status": STATUSES[i % len(STATUSES)],
+        # Epics store "" for no due date, stories and tasks None
+        "due_date": "" if kind == "epic" else None,
+        **fields,
+    }
+
+
+def bulk_updates(ids: list, i: int) -> list:
+    start = (i * BULK_SIZE) % len(ids)
+    return [
+        {"id": id, "data": {"status": STATUSES[i % len(STATUSES)]}}
+        for id in ids[start : start + BULK_SIZE]
+    ]
+
+
+SCENARIOS = [
+    # Reads
+    Scenario("get_epics", "get_epics", lambda d, i: get({})),
+    Scenario(
+        "get_epics_by_creator",
+        "get_epics",
+        lambda d, i: get({"creator_id": d.pick(d.users, i)}),
+    ),
+    Scenario(
+        "get_stories_by_epic",
+        "get_stories",
+        lambda d, i: get({"epic_id": d.pick(d.epics, i)}),
+    ),
+    Scenario(
+        "get_tasks_by_user_status",
+        "get_tasks",
+        lambda d, i: get({"assigned_user_id": d.pick(d.users, i), "status": "Pending"}),
+    ),
+    Scenario("get_tasks_page", "get_tasks", lambda d, i: get({"limit": "100"})),
+    Scenario(
+        "get_tasks_ndjson",
+        "get_tasks",
+        lambda d, i: get({"story_id": d.pick(d.stories, i), "format": "ndjson"}),
+    ),
+    Scenario(
+        "get_tasks_since",
+        "get_tasks",
+        lambda d, i: get({"since": d.seeded_at, "limit": "100"}),
+    ),
+    Scenario(
+        "get_tasks_from_epic",
+        "get_tasks_from_epic",
+        lambda d, i: get({"id": d.pick(d.epics, i)}),
+    ),
+    Scenario(
+        "get_epic_from_task",
+        "get_epic_from_task",
+        lambda d, i: get({"id": d.pick(d.tasks, i)}),
+    ),
+    Scenario(
+        "get_epic_progress",
+        "get_epic_progress",
+        lambda d, i: get({"id": d.pick(d.epics, i)}),
+    ),
+    Scenario("search_prefix", "search", lambda d, i: get({"q": "benchmark ta"})),
+    Scenario(
+        "search_tasks",
+        "search",
+        lambda d, i: get({"q": "task ", "collection": "tasks", "limit": "50"}),
+    ),
+    Scenario(
+        "get_schedule",
+        "get_schedule",
+        lambda d, i: get({"user_id": d.pick(d.users, i)}),
+    ),
+    Scenario(
+        "get_uid",
+        "get_uid",
+        lambda d, i: get({"email": f"{d.pick(d.users, i)}@example.com"}),
+        requires="FIREBASE_AUTH_EMULATOR_HOST",
+    ),
+    # Writes
+    Scenario(
+        "update_schedule",
+        "update_schedule",
+        lambda d, i: {
+            "method": "POST",
+            "args": {"user_id": d.pick(d.users, i)},
+            "body": {"schedule": {"pinned": [d.pick(d.tasks, i)]}},
+        },
+    ),
+    Scenario("upload_epic", "upload_epic", lambda d, i: call(new_item("epic", i))),
+    Scenario(
+        "upload_story",
+        "upload_story",
+        lambda d, i: call(new_item("story", i, epic_id=d.pick(d.epics, i))),
+    ),
+    Scenario(
+        "upload_task",
+        "upload_task",
+        lambda d, i: call(new_item("task", i, story_id=d.pick(d.stories, i))),
+    ),
+    Scenario(
+        "update_epic",
+        "update_epic",
+        lambda d, i: {
+            "method": "PATCH",
+            "args": {"id": d.pick(d.epics, i)},
+            "body": {"data": {"status": STATUSES[i % len(STATUSES)]}},
+        },
+    ),
+    Scenario(
+        "update_story",
+        "update_story",
+        lambda d, i: {
+            "method": "PATCH",
+            "args": {"id": d.pick(d.stories, i)},
+            "body": {"data": {"status": STATUSES[i % len(STATUSES)]}},
+        },
+    ),
+    Scenario(
+        "update_task",
+        "update_task",
+        lambda d, i: {
+            "method": "PATCH",
+            "args": {"id": d.pick(d.tasks, i)},
+            "body": {"data": {"status": STATUSES[i % len(STATUSES)]}},
+        },
+    ),
+    Scenario(
+        "bulk_upload_epics",
+        "bulk_upload_epics",
+        lambda d, i: call([new_item("epic", n) for n in range(BULK_SIZE)]),
+    ),
+    Scenario(
+        "bulk_upload_stories",
+        "bulk_upload_stories",
+        lambda d, i: call(
+            [new_item("story", n, epic_id=d.pick(d.epics, n)) for n in range(BULK_SIZE)]
+        ),
+    ),
+    Scenario(
+        "bulk_upload_tasks",
+        "bulk_upload_tasks",
+        lambda d, i: call(
+            [
+                new_item("task", n, story_id=d.pick(d.stories, n))
+                for n in range(BULK_SIZE)
+            ]
+        ),
+    ),
+    Scenario(
+        "bulk_update_epics",
+        "bulk_update_epics",
+        lambda d, i: {"method": "PATCH", "body": {"data": bulk_updates(d.epics, i)}},
+    ),
+    Scenario(
+        "bulk_update_stories",
+        "bulk_update_stories",
+        lambda d, i: {"method": "PATCH", "body": {"data": bulk_updates(d.stories, i)}},
+    ),
+    Scenario(
+        "bulk_update_tasks",
+        "bulk_update_tasks",
+        lambda d, i: {"method": "PATCH", "body": {"data": bulk_updates(d.tasks, i)}},
+    ),
+    # Maintenance
+    Scenario(
+        "backfill_task_epic_ids",
+        "backfill_task_epic_ids",
+        lambda d, i: {"method": "POST", "args": {"limit": "200"}},
+    ),
+    Scenario(
+        "repair_progress_rollups",
+        "repair_progress_rollups",
+        lambda d, i: {"method": "POST", "args": {"limit": "20"}},
+    ),
+    Scenario(
+        "rebuild_search_index",
+        "rebuild_search_index",
+        lambda d, i: {
+            "method": "POST",
+            "args": {"collection": "tasks", "limit": "500"},
+        },
+    ),
+]
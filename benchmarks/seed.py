@@ -0,0 +1,130 @@
+"""Synthetic epic/story/task hierarchies for the benchmarks.
+
+Ids, users, statuses and due dates come from a seeded random generator, so the
+same dimensions always produce the same data. Everything is written through
+main.bulk_upload_items, the same path the bulk endpoints use, so parent links
+and denormalized epic ids match what production writes. Progress rollups are
+kept by the on_task_written trigger, which does not run against the bare
+emulator, so seed applies the same deltas itself.
+"""
+
+import os
+import random
+import urllib.request
+from datetime import datetime, timedelta, timezone
+from typing import NamedTuple
+
+STATUSES = ("Pending", "In Progress", "Completed")
+
+
+class Dataset(NamedTuple):
+    epics: list
+    stories: list
+    tasks: list
+    users: list
+    seeded_at: str
+
+    def pick(self, ids: list, i: int) -> str:
+        # Walk the ids with a stride so consecutive calls hit different parents
+        return ids[(i * 7919) % len(ids)]
+
+
+def clear_emulator(project: str) -> None:
+    # The emulator's reset endpoint drops every document of the database
+    host = os.environ["FIRESTORE_EMULATOR_HOST"]
+    url = f"http://{host}/emulator/v1/projects/{project}/databases/(default)/documents"
+    urllib.request.urlopen(urllib.request.Request(url, method="DELETE")).close()
+
+
+def make_item(kind: str, rng: random.Random, users: list, now: datetime) -> dict:
+    due = now + timedelta(days=rng.randint(-5, 20), hours=rng.randint(0, 23))
+    return {
+        "name": f"{kind} {rng.getrandbits(32):08x}",
+        "description": f"Benchmark {kind}",
+        "creator_id": rng.choice(users),
+        "assigned_user_id": rng.choice(users),
+        "status": rng.choice(STATUSES),
+        "due_date": due.replace(microsecond=0).isoformat(),
+    }
+
+
+def seed(
+    epics: int, stories: int, tasks: int, users: int = 20, random_seed: int = 0
+) -> Dataset:
+    """Write epics × stories × tasks documents and return their ids"""
+    import main
+
+    rng = random.Random(random_seed)
+    now = datetime.now(timezone.utc)
+    user_ids = [f"bench-user-{n}" for n in range(users)]
+    epic_items, story_items, task_items = [], [], []
+    for e in range(epics):
+        epic_id = f"bench-epic-{e}"
+        epic_items.append(
+            {
+                **make_item("epic", rng, user_ids, now),
+                "id": epic_id,
+            }
+        )
+        for s in range(stories):
+            story_id = f"bench-story-{e}-{s}"
+            story_items.append(
+                {
+                    **make_item("story", rng, user_ids, now),
+                    "id": story_id,
+                    "epic_id": epic_id,
+                }
+            )
+            for t in range(tasks):
+                task_items.append(
+                    {
+                        **make_item("task", rng, user_ids, now),
+                        "id": f"bench-task-{e}-{s}-{t}",
+                        "story_id": story_id,
+                    }
+                )
+
+    for collection, items in (
+        ("epics", epic_items),
+        ("stories", story_items),
+        ("tasks", task_items),
+    ):
+        for i in range(0, len(items), main.MAX_BULK_ITEMS):
+            results = main.bulk_upload_items(
+                collection, items[i : i + main.MAX_BULK_ITEMS]
+            )
+            failed = [result for result in results if result["status"] != "ok"]
+            if failed:
+                raise RuntimeError(f"Seeding {collection} failed: {failed[:3]}")
+
+    from rollups import task_deltas
+
+    epic_of_story = {item["id"]: item["epic_id"] for item in story_items}
+    deltas = None
+    for item in task_items:
+        task = {**item, "epic_id": epic_of_story[item["story_id"]]}
+        deltas = task_deltas(None, task, deltas)
+    errors = main.run_bulk_writes(main.rollup_writes(deltas or {}), stamp=False)
+    if errors:
+        raise RuntimeError(f"Seeding rollups failed: {list(errors.items())[:3]}")
+
+    return Dataset(
+        epics=[item["id"] for item in epic_items],
+        stories=[item["id"] for item in story_items],
+        tasks=[item["id"] for item in task_items],
+        users=user_ids,
+        seeded_at=now.isoformat(),
+    )
+
+
+def seed_auth_users(dataset: Dataset) -> None:
+    # get_uid resolves emails through Auth, so its scenario needs matching
+    # users in the Auth emulator
+    from db import get_auth
+
+    auth = get_auth()
+    for user_id in dataset.users:
+        try:
+            auth.create_user(uid=user_id, email=f"{user_id}@example.com")
+        except auth.UidAlreadyExistsError:
+            pass
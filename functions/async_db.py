@@ -0,0 +1,110 @@
+# Async Firestore data access for handlers that fan out.
+#
+# The async client keeps gRPC channels bound to the event loop that created
+# them, so all coroutines run on one long-lived loop in a background thread
+# that is reused by every invocation on a warm instance. Sync handlers submit
+# work with run().
+
+import asyncio
+import os
+import threading
+
+from cache import MISSING, CachedDocument, entity_cache, entity_key
+from db import get_app
+from instrumentation import bind, record
+
+# Firestore accepts at most 30 values in an "in" filter
+IN_QUERY_LIMIT = 30
+# Upper bound on concurrent Firestore calls issued by a single gather
+MAX_CONCURRENCY = int(os.environ.get("FIRESTORE_MAX_CONCURRENCY", "16"))
+
+_lock = threading.Lock()
+_loop = None
+_client = None
+
+
+def _get_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    if _loop is None:
+        with _lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(
+                    target=loop.run_forever, name="firestore-async", daemon=True
+                ).start()
+                _loop = loop
+    return _loop
+
+
+def run(coro, timeout: float = None):
+    """Run a coroutine on the shared loop and wait for its result"""
+    return asyncio.run_coroutine_threadsafe(bind(coro), _get_loop()).result(timeout)
+
+
+def get_async_client():
+    """Return the process-wide async Firestore client"""
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                from firebase_admin import firestore_async
+
+                _client = firestore_async.client(get_app())
+    return _client
+
+
+async def gather_bounded(coros, limit: int = MAX_CONCURRENCY) -> list:
+    """Await coroutines concurrently, at most limit at a time, in order"""
+    semaphore = asyncio.Semaphore(limit)
+
+    async def bounded(coro):
+        async with semaphore:
+            return await coro
+
+    return await asyncio.gather(*(bounded(coro) for coro in coros))
+
+
+async def stream(query) -> list:
+    docs = [doc async for doc in query.stream()]
+    # A query is billed at least one read even when it matches nothing
+    record(reads=max(len(docs), 1), queries=1)
+    return docs
+
+
+async def get_doc(collection: str, id: str, field_paths: list = None):
+    # Async counterpart of main.get_doc_by_id_from_db, sharing its cache
+    if not id:
+        return None
+    key = entity_key(collection, id)
+    data = entity_cache.get(key)
+    if data is MISSING:
+        doc = await get_async_client().collection(collection).document(id).get()
+        record(reads=1)
+        if not doc.exists:
+            return None
+        data = doc.to_dict()
+        entity_cache.set(key, data)
+    return CachedDocument(id, data, field_paths)
+
+
+async def query_in_chunks(
+    collection: str,
+    field: str,
+    values: list,
+    filters: dict = None,
+    field_paths: list = None,
+) -> list:
+    # Query documents whose field is any of values. The values are split into
+    # chunks that fit one "in" filter and the chunks run concurrently
+    queries = []
+    for i in range(0, len(values), IN_QUERY_LIMIT):
+        query = get_async_client().collection(collection)
+        query = query.where(field, "in", values[i : i + IN_QUERY_LIMIT])
+        for filter_field, value in (filters or {}).items():
+            if value:
+                query = query.where(filter_field, "==", value)
+        if field_paths:
+            query = query.select(field_paths)
+        queries.append(query)
+    results = await gather_bounded(stream(query) for query in queries)
+    return [doc for docs in results for doc in docs]
@@ -0,0 +1,83 @@
+# Workspace export/import format.
+#
+# A backup is gzip-compressed NDJSON with one record per document:
+#
+#   {"collection": "stories", "id": "...", "data": {...document fields...}}
+#
+# A full export lists every epic, then every story, then every task. An export
+# of selected epics lists each epic followed by its stories and its tasks.
+#
+# Documents are exported as stored. The hierarchy lives in each child's own
+# epic_id and story_id, so an import restores it exactly. Progress rollups are
+# left out: the task triggers rebuild them from the imported tasks. Both
+# directions work on iterators of chunks, so memory stays flat whatever the
+# size of the workspace.
+
+import json
+import zlib
+
+from serialization import dumps
+
+# Order in which collections are exported and imported, parents first
+COLLECTIONS = ("epics", "stories", "tasks")
+# Fields that are regenerated on import instead of restored, and the child id
+# arrays of backups taken before children were listed by parent id
+SKIPPED_FIELDS = frozenset(
+    {"updated_at", "progress", "child_user_stories", "child_tasks"}
+)
+# Bytes read from the request body at a time
+READ_SIZE = 64 * 1024
+GZIP_MAGIC = b"\x1f\x8b"
+
+
+def encode_record(collection: str, doc) -> bytes:
+    data = {k: v for k, v in doc.to_dict().items() if k not in SKIPPED_FIELDS}
+    return dumps({"collection": collection, "id": doc.id, "data": data}) + b"\n"
+
+
+def gzip_chunks(lines):
+    # Compress an iterator of lines into gzip chunks as they are produced
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    for line in lines:
+        chunk = compressor.compress(line)
+        if chunk:
+            yield chunk
+    yield compressor.flush()
+
+
+def read_lines(stream, read_size: int = READ_SIZE):
+    # Yield the non-empty lines of a file-like body, gunzipping it on the fly
+    # when it starts with the gzip magic bytes
+    chunk = stream.read(read_size)
+    decompressor = None
+    if chunk[:2] == GZIP_MAGIC:
+        decompressor = zlib.decompressobj(wbits=16 + zlib.MAX_WBITS)
+    buffer = b""
+    while chunk:
+        buffer += decompressor.decompress(chunk) if decompressor else chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield line
+        chunk = stream.read(read_size)
+    if decompressor:
+        buffer += decompressor.flush()
+    if buffer.strip():
+        yield buffer
+
+
+def decode_record(line: bytes, models: dict) -> tuple[str, str, dict]:
+    # Parse and validate one record against models ({collection: model}).
+    # Raises ValueError for anything that is not a valid epic, story or task
+    try:
+        entry = json.loads(line)
+        collection, id, data = entry["collection"], entry["id"], entry["data"]
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError(f"Malformed record: {e}")
+    if not isinstance(collection, str) or collection not in models:
+        raise ValueError(f"Unknown collection: {collection}")
+    if not isinstance(id, str) or not id or "/" in id or not isinstance(data, dict):
+        raise ValueError("Record needs a document id and a data object")
+    models[collection].from_dict(data, id=id)
+    data = {k: v for k, v in data.items() if k not in SKIPPED_FIELDS}
+    return collection, id, {**data, "id": id}
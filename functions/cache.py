@@ -0,0 +1,188 @@
+# Read-through cache for entity lookups.
+#
+# Each warm instance keeps a bounded TTL + LRU cache in memory. An optional
+# shared backend (see CacheBackend) sits behind it so that instances can share
+# entries; InMemoryBackend is a local stand-in with the same interface.
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+MISSING = object()
+
+
+class CachedDocument:
+    """Read-only stand-in for a DocumentSnapshot built from cached data"""
+
+    __slots__ = ("id", "_data")
+    exists = True
+
+    def __init__(self, id: str, data: dict, field_paths: list = None):
+        self.id = id
+        if field_paths is not None:
+            data = {field: data[field] for field in field_paths if field in data}
+        self._data = data
+
+    def to_dict(self) -> dict:
+        return dict(self._data)
+
+
+class CacheBackend:
+    """Interface for a cache shared between instances. Values are JSON-able"""
+
+    def get(self, key: str):
+        raise NotImplementedError
+
+    def set(self, key: str, value, ttl: float) -> None:
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+
+class InMemoryBackend(CacheBackend):
+    """Process-local CacheBackend, e.g. for tests and the emulator"""
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return MISSING
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return MISSING
+            return json.loads(value)
+
+    def set(self, key: str, value, ttl: float) -> None:
+        # Round-trip through JSON like a networked backend would
+        with self._lock:
+            self._entries[key] = (
+                time.monotonic() + ttl,
+                json.dumps(value, default=str),
+            )
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+class RedisBackend(CacheBackend):
+    """CacheBackend on Redis/Memorystore. Needs the optional redis package"""
+
+    def __init__(self, url: str):
+        import redis
+
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, key: str):
+        value = self._client.get(key)
+        return MISSING if value is None else json.loads(value)
+
+    def set(self, key: str, value, ttl: float) -> None:
+        self._client.set(key, json.dumps(value, default=str), px=int(ttl * 1000))
+
+    def delete(self, key: str) -> None:
+        self._client.delete(key)
+
+
+class TTLCache:
+    """Bounded TTL + LRU cache with hit/miss counters"""
+
+    def __init__(self, max_size: int, ttl: float, backend: CacheBackend = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at >= time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+        if self.backend is not None:
+            value = self.backend.get(key)
+            if value is not MISSING:
+                self._set_local(key, value)
+                with self._lock:
+                    self.hits += 1
+                return value
+        with self._lock:
+            self.misses += 1
+        return MISSING
+
+    def set(self, key: str, value) -> None:
+        self._set_local(key, value)
+        if self.backend is not None:
+            self.backend.set(key, value, self.ttl)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+        if self.backend is not None:
+            self.backend.delete(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self._entries),
+            }
+
+    def _set_local(self, key: str, value) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+
+def backend_from_env() -> CacheBackend | None:
+    url = os.environ.get("CACHE_REDIS_URL")
+    return RedisBackend(url) if url else None
+
+
+def entity_key(collection: str, id: str) -> str:
+    # Same as the document path, so DocumentReference.path can be used directly
+    return f"{collection}/{id}"
+
+
+# Entity documents keyed by entity_key(), holding the document data
+entity_cache = TTLCache(
+    max_size=int(os.environ.get("ENTITY_CACHE_SIZE", "2048")),
+    ttl=float(os.environ.get("ENTITY_CACHE_TTL", "30")),
+    backend=backend_from_env(),
+)
+
+# Email -> UID lookups. Unknown emails are cached separately and for a shorter
+# time so that users who just signed up are found quickly
+uid_cache = TTLCache(
+    max_size=int(os.environ.get("UID_CACHE_SIZE", "10000")),
+    ttl=float(os.environ.get("UID_CACHE_TTL", "600")),
+)
+missing_uid_cache = TTLCache(
+    max_size=int(os.environ.get("UID_CACHE_SIZE", "10000")),
+    ttl=float(os.environ.get("MISSING_UID_CACHE_TTL", "60")),
+)
@@ -0,0 +1,100 @@
+# Shared Firebase app and Firestore client for the whole process.
+#
+# Everything is created on first use and then reused by every invocation served
+# by a warm instance. firebase_admin and its Firestore/Auth modules are imported
+# lazily so that a cold start only pays for the services a function touches.
+
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Field path Firestore uses for the document id in order_by/start_after
+DOCUMENT_ID = "__name__"
+# Commit timestamp stamped onto every epic/story/task write. List ETags and
+# since= change queries are derived from it
+UPDATED_AT = "updated_at"
+
+
+class DocumentNotFound(Exception):
+    """The document an update targets does not exist"""
+
+
+# Cold starts slower than this (module import + client creation) are logged as
+# warnings so regressions show up in the function logs
+COLD_START_BUDGET_MS = float(os.environ.get("COLD_START_BUDGET_MS", "1000"))
+
+_lock = threading.RLock()
+_app = None
+_client = None
+_import_ms = None
+
+
+def get_app():
+    global _app
+    if _app is None:
+        with _lock:
+            if _app is None:
+                import firebase_admin
+
+                try:
+                    _app = firebase_admin.get_app()
+                except ValueError:
+                    _app = firebase_admin.initialize_app()
+    return _app
+
+
+def get_client():
+    """Return the process-wide Firestore client"""
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                started = time.perf_counter()
+                from firebase_admin import firestore
+
+                _client = firestore.client(get_app())
+                _report_cold_start("firestore", started)
+    return _client
+
+
+def get_auth():
+    """Return the firebase_admin.auth module bound to the shared app"""
+    get_app()
+    from firebase_admin import auth
+
+    return auth
+
+
+def stamped(data: dict) -> dict:
+    """Return a copy of data that also sets updated_at to the commit time"""
+    from google.cloud.firestore import SERVER_TIMESTAMP
+
+    return {**data, UPDATED_AT: SERVER_TIMESTAMP}
+
+
+def record_import_time(started: float) -> None:
+    # Called once at the end of main.py with the perf_counter() value taken
+    # before its imports
+    global _import_ms
+    _import_ms = (time.perf_counter() - started) * 1000
+    logger.info("Module import took %.1f ms", _import_ms)
+
+
+def _report_cold_start(service: str, started: float) -> None:
+    init_ms = (time.perf_counter() - started) * 1000
+    total_ms = init_ms + (_import_ms or 0)
+    if total_ms > COLD_START_BUDGET_MS:
+        logger.warning(
+            "Cold start over budget: %.1f ms "
+            "(import %.1f ms, %s init %.1f ms, budget %.0f ms)",
+            total_ms,
+            _import_ms or 0,
+            service,
+            init_ms,
+            COLD_START_BUDGET_MS,
+        )
+    else:
+        logger.info("%s client initialized in %.1f ms", service, init_ms)
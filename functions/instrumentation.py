@@ -0,0 +1,163 @@
+# Request instrumentation.
+#
+# @instrumented wraps the handlers and the data-access helpers. The outermost
+# instrumented call of a request opens a trace; every instrumented call inside it
+# adds its wall time to the trace, and data-access code reports the Firestore
+# documents it read and wrote and the queries it ran with record(). When the
+# request finishes, the trace is logged as a single JSON line, which Cloud Logging
+# turns into a structured entry:
+#
+#   {"message": "trace get_tasks_from_epic", "ms": 41.2, "reads": 120,
+#    "writes": 0, "queries": 2, "bytes": 30412,
+#    "spans": {"get_tasks_from_epic": {"calls": 1, "ms": 41.2}}}
+#
+# INSTRUMENTATION_SAMPLE_RATE (0 to 1, default 1) sets the share of requests
+# that are traced; the others only pay for one random() call. With
+# INSTRUMENTATION_OTEL=1 every instrumented call is also exported as an
+# OpenTelemetry span carrying its counters, through whatever tracer provider the
+# process configured. opentelemetry is optional and only imported then.
+
+import contextlib
+import contextvars
+import functools
+import json
+import logging
+import os
+import random
+import time
+
+SAMPLE_RATE = float(os.environ.get("INSTRUMENTATION_SAMPLE_RATE", "1"))
+OTEL_ENABLED = os.environ.get("INSTRUMENTATION_OTEL") == "1"
+COUNTERS = ("reads", "writes", "queries", "bytes")
+
+logger = logging.getLogger(__name__)
+
+# The current request's Trace, False when the request was not sampled and None
+# outside of any instrumented call
+_current = contextvars.ContextVar("trace", default=None)
+_tracer = None
+
+
+class Trace:
+    __slots__ = ("name", "counts", "spans")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.counts = dict.fromkeys(COUNTERS, 0)
+        # name -> [calls, total ms]
+        self.spans = {}
+
+    def add_span(self, name: str, ms: float) -> None:
+        span = self.spans.setdefault(name, [0, 0.0])
+        span[0] += 1
+        span[1] += ms
+
+    def log(self, ms: float) -> None:
+        entry = {
+            "message": f"trace {self.name}",
+            "ms": round(ms, 1),
+            **self.counts,
+            "spans": {
+                name: {"calls": calls, "ms": round(total, 1)}
+                for name, (calls, total) in self.spans.items()
+            },
+        }
+        logger.info(json.dumps(entry))
+
+
+def record(reads: int = 0, writes: int = 0, queries: int = 0) -> None:
+    """Add Firestore usage to the current trace, if the request is traced"""
+    trace = _current.get()
+    if trace:
+        trace.counts["reads"] += reads
+        trace.counts["writes"] += writes
+        trace.counts["queries"] += queries
+
+
+@contextlib.contextmanager
+def capture(name: str = "capture"):
+    """Trace everything run inside the block into the yielded Trace instead of
+    logging it, regardless of the sample rate. Used by the benchmarks"""
+    trace = Trace(name)
+    token = _current.set(trace)
+    try:
+        yield trace
+    finally:
+        _current.reset(token)
+
+
+def bind(coro):
+    # Coroutines run on async_db's loop thread, outside the request's context.
+    # Carry the trace over so their record() calls are counted
+    trace = _current.get()
+    if not trace:
+        return coro
+
+    async def bound():
+        _current.set(trace)
+        return await coro
+
+    return bound()
+
+
+def instrumented(func):
+    """Time func and, when it starts a request, trace and log the request"""
+    name = func.__name__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        trace = _current.get()
+        if trace is False:
+            return func(*args, **kwargs)
+        token = None
+        if trace is None:
+            if random.random() >= SAMPLE_RATE:
+                token = _current.set(False)
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    _current.reset(token)
+            trace = Trace(name)
+            token = _current.set(trace)
+
+        before = dict(trace.counts)
+        started = time.perf_counter()
+        try:
+            with _span(name) as span:
+                result = func(*args, **kwargs)
+                if token is not None:
+                    trace.counts["bytes"] += response_bytes(result)
+                if span is not None:
+                    span.set_attributes(
+                        {
+                            f"app.{counter}": trace.counts[counter] - before[counter]
+                            for counter in COUNTERS
+                        }
+                    )
+                return result
+        finally:
+            ms = (time.perf_counter() - started) * 1000
+            trace.add_span(name, ms)
+            if token is not None:
+                _current.reset(token)
+                trace.log(ms)
+
+    return wrapper
+
+
+def response_bytes(result) -> int:
+    # Size of a buffered response body. Streamed bodies and values the
+    # framework serializes later are not counted
+    calculate = getattr(result, "calculate_content_length", None)
+    return (calculate() or 0) if calculate else 0
+
+
+def _span(name: str):
+    global _tracer
+    if not OTEL_ENABLED:
+        return contextlib.nullcontext()
+    if _tracer is None:
+        from opentelemetry import trace
+
+        _tracer = trace.get_tracer(__name__)
+    return _tracer.start_as_current_span(name)
@@ -2,11 +2,62 @@
 # To get started, simply uncomment the below code or create your own.
 # Deploy with `firebase deploy`
 
-from firebase_functions import https_fn
+import time
+
+_IMPORT_STARTED = time.perf_counter()
+
+import logging
+from datetime import datetime, timedelta, timezone
+
+from firebase_functions import firestore_fn, https_fn
 from firebase_functions.options import set_global_options
-from firebase_admin import initialize_app, auth, firestore
-from models import Epic, Story, Task
+from db import (
+    DOCUMENT_ID,
+    UPDATED_AT,
+    DocumentNotFound,
+    get_auth,
+    get_client,
+    record_import_time,
+    stamped,
+)
+from models import Epic, Story, Task, check_document_id, validate_update
+import async_db
+from backup import COLLECTIONS, decode_record, encode_record, gzip_chunks, read_lines
+from instrumentation import instrumented, record
+from cache import (
+    MISSING,
+    CachedDocument,
+    entity_cache,
+    entity_key,
+    missing_uid_cache,
+    uid_cache,
+)
+from queries import build_query, changes_query, paginate_query, query_version
+from repositories import get_repo
+from rollups import build_progress, nonzero, summarize, task_deltas
+from schedule import (
+    ENTRY_FIELDS,
+    MAX_ITEMS,
+    OPEN_STATUSES,
+    apply_change,
+    build_items,
+    day_plan,
+    entry_from_task,
+)
+from search import (
+    FIELD_WEIGHTS,
+    MIN_PREFIX,
+    index_collection,
+    index_entry,
+    lookup_term,
+    parse_query,
+    rank,
+    touches_index,
+)
+from serialization import doc_to_json, docs_to_json_array, dumps
+import hashlib
 import uuid
+from collections import defaultdict
 from flask import Response, json
 
 # For cost control, you can set the maximum number of containers that can be
@@ -16,13 +67,58 @@ from flask import Response, json
 # parameter in the decorator, e.g. @https_fn.on_request(max_instances=5).
 set_global_options(max_instances=10)
 
-initialize_app()
+logger = logging.getLogger(__name__)
+
+# Largest page the list endpoints return for a single request
+MAX_PAGE_SIZE = 1000
+# Largest page a maintenance job processes per call
+MAX_MAINTENANCE_PAGE_SIZE = 500
+# Largest number of items a single bulk_* call accepts
+MAX_BULK_ITEMS = 5000
+# Auth accepts at most 100 identifiers per get_users call
+AUTH_BATCH_SIZE = 100
+# Largest number of emails get_uid resolves in one request
+MAX_UID_LOOKUPS = 1000
+# Page size limit of search results, and the most index entries of each
+# collection ranked per search
+MAX_SEARCH_PAGE = 100
+MAX_SEARCH_CANDIDATES = 1000
+# Documents read per page by export_workspace, documents written per bulk
+# writer run by import_workspace, and import errors reported individually
+EXPORT_PAGE_SIZE = 500
+IMPORT_BATCH_SIZE = 500
+MAX_IMPORT_ERRORS = 100
+# Attempts of a PATCH whose document keeps changing between read and write
+PATCH_MAX_ATTEMPTS = 5
+# gRPC status codes the bulk writer retries, and how many attempts it makes
+BULK_RETRYABLE_CODES = {4, 8, 10, 13, 14}
+BULK_MAX_ATTEMPTS = 5
+# Ids of the trigger events already applied, kept long enough to outlive
+# duplicate deliveries and retries. Expired markers are removed by the TTL
+# policy on expires_at
+TRIGGER_EVENTS = "trigger_events"
+TRIGGER_EVENT_TTL = timedelta(days=7)
+
+# collection -> (model, parent collection, parent id field)
+HIERARCHY = {
+    "epics": (Epic, None, None),
+    "stories": (Story, "epics", "epic_id"),
+    "tasks": (Task, "stories", "story_id"),
+}
+# Child id arrays parents used to carry, parent collection -> (child
+# collection, array field). Children are now listed by their parent id field;
+# migrate_child_id_arrays removes the arrays from existing documents
+LEGACY_CHILD_ARRAYS = {
+    "epics": ("stories", "child_user_stories"),
+    "stories": ("tasks", "child_tasks"),
+}
 
 # ========== ITEMS ==========
 
 
 # Epics
 @https_fn.on_call()
+@instrumented
 def upload_epic(request: https_fn.CallableRequest) -> https_fn.Response:
     epic_data = request.data
     try:
@@ -31,13 +127,14 @@ def upload_epic(request: https_fn.CallableRequest) -> https_fn.Response:
         raise https_fn.HttpsError("invalid-argument", f"Error parsing epic data: {e}")
 
     try:
-        epic_ref = Epic.to_firestore(epic, firestore.client())
+        upload_item("epics", epic)
     except Exception as e:
         raise https_fn.HttpsError("internal", f"Error uploading epic: {e}")
-    return Epic.from_firestore(epic_ref.get()).to_dict()
+    return epic.to_dict()
 
 
 @https_fn.on_request()
+@instrumented
 def get_epics(req: https_fn.Request) -> https_fn.Response:
     creator_id = req.args.get("creator_id", None)
     assigned_user_id = req.args.get("assigned_user_id", None)
@@ -49,11 +146,11 @@ def get_epics(req: https_fn.Request) -> https_fn.Response:
         "status": status,
     }
     # Fetch epics for the user from your database or other service
-    epics = get_epics_from_db(query_params)
-    return [epics[i].to_dict() for i in range(len(epics))]
+    return list_response(req, "epics", query_params, Epic)
 
 
 @https_fn.on_request()
+@instrumented
 def update_epic(req: https_fn.Request) -> https_fn.Response:
     if req.method != "PATCH":
         raise https_fn.HttpsError("invalid-argument", "Invalid request method")
@@ -67,37 +164,55 @@ def update_epic(req: https_fn.Request) -> https_fn.Response:
         raise https_fn.HttpsError("invalid-argument", "No data provided for update")
     try:
         return patch_epic_in_db_with_fields(id, update_data).to_dict()
+    except DocumentNotFound as e:
+        raise https_fn.HttpsError("not-found", str(e))
+    except ValueError as e:
+        raise https_fn.HttpsError("invalid-argument", f"Invalid update: {e}")
     except Exception as e:
         raise https_fn.HttpsError("internal", f"Error updating epic: {e}")
 
 
 @https_fn.on_request()
+@instrumented
 def get_epic_from_task(req: https_fn.Request) -> https_fn.Response:
     id = req.args.get("id", None)
     if not id:
         raise https_fn.HttpsError("invalid-argument", "id is required")
 
-    query_params = {
-        "id": id,
-    }
-
-    # Fetch Story for the task
-    task = get_tasks_from_db(query_params)
-
-    query_params = {
-        "story_id": task[0].story_id,
-    }
-    story = get_stories_from_db(query_params)
-
-    query_params = {
-        "id": story[0].epic_id,
-    }
-    epic = get_epics_from_db(query_params)[0]
-    return epic.to_dict()
+    fields = requested_fields(req, Epic)
+
+    # Tasks carry their epic_id, so after the task read the story and the epic
+    # are fetched concurrently. Tasks that predate epic_id fall back to
+    # following the story
+    task = get_doc_by_id_from_db("tasks", id, ["story_id", "epic_id"])
+    if not task:
+        raise https_fn.HttpsError("not-found", "Task not found")
+    story_id = task.to_dict().get("story_id")
+    epic_id = task.to_dict().get("epic_id")
+    story, epic = async_db.run(
+        async_db.gather_bounded(
+            [
+                async_db.get_doc("stories", story_id, ["epic_id"]),
+                async_db.get_doc("epics", epic_id, fields),
+            ]
+        )
+    )
+    if not story:
+        raise https_fn.HttpsError("not-found", "Story not found")
+    if not epic_id:
+        epic_id = story.to_dict().get("epic_id")
+        epic = get_doc_by_id_from_db("epics", epic_id, fields) if epic_id else None
+    if not epic:
+        raise https_fn.HttpsError("not-found", "Epic not found")
+    # Tag the body so polling clients get a 304 when the epic is unchanged
+    response = https_fn.Response(doc_to_json(epic), mimetype="application/json")
+    response.add_etag()
+    return response.make_conditional(req)
 
 
 # Stories
 @https_fn.on_call()
+@instrumented
 def upload_story(request: https_fn.CallableRequest) -> https_fn.Response:
     story_data = request.data
     try:
@@ -105,36 +220,17 @@ def upload_story(request: https_fn.CallableRequest) -> https_fn.Response:
     except Exception as e:
         raise https_fn.HttpsError("invalid-argument", f"Error parsing story data: {e}")
 
+    if story.epic_id and not get_doc_by_id_from_db("epics", story.epic_id):
+        raise https_fn.HttpsError("not-found", "Epic not found")
     try:
-        story_ref = Story.to_firestore(story, firestore.client())
+        upload_item("stories", story)
     except Exception as e:
         raise https_fn.HttpsError("internal", f"Error uploading story: {e}")
-
-    if story.epic_id != "":
-        try:
-            # Append the new story ID to the epic's child_user_stories array
-            # Get epic child_user_stories and append
-            query_params = {
-                "id": story.epic_id,
-            }
-            epic = get_epics_from_db(query_params)[0]
-            if not epic:
-                raise https_fn.HttpsError("not-found", "Epic not found")
-
-            patch_epic_in_db_with_fields(
-                epic.id,
-                {"child_user_stories": epic.child_user_stories + [story.id]},
-            )
-
-        except Exception as e:
-            story_ref.delete()
-            raise https_fn.HttpsError(
-                "internal", f"Error updating epic with new story: {e}"
-            )
     return story.to_dict()
 
 
 @https_fn.on_request()
+@instrumented
 def get_stories(req: https_fn.Request) -> https_fn.Response:
     creator_id = req.args.get("creator_id", None)
     assigned_user_id = req.args.get("assigned_user_id", None)
@@ -148,11 +244,11 @@ def get_stories(req: https_fn.Request) -> https_fn.Response:
         "status": status,
     }
     # Fetch stories for the user from your database or other service
-    stories = get_stories_from_db(query_params)
-    return [story.to_dict() for story in stories]
+    return list_response(req, "stories", query_params, Story)
 
 
 @https_fn.on_request()
+@instrumented
 def update_story(req: https_fn.Request) -> https_fn.Response:
     if req.method != "PATCH":
         raise https_fn.HttpsError("invalid-argument", "Invalid request method")
@@ -166,12 +262,17 @@ def update_story(req: https_fn.Request) -> https_fn.Response:
         raise https_fn.HttpsError("invalid-argument", "No data provided for update")
     try:
         return patch_story_in_db_with_fields(id, update_data).to_dict()
+    except DocumentNotFound as e:
+        raise https_fn.HttpsError("not-found", str(e))
+    except ValueError as e:
+        raise https_fn.HttpsError("invalid-argument", f"Invalid update: {e}")
     except Exception as e:
         raise https_fn.HttpsError("internal", f"Error updating story: {e}")
 
 
 # Tasks
 @https_fn.on_call()
+@instrumented
 def upload_task(request: https_fn.CallableRequest) -> https_fn.Response:
     task_data = request.data
     try:
@@ -179,31 +280,26 @@ def upload_task(request: https_fn.CallableRequest) -> https_fn.Response:
     except Exception as e:
         raise https_fn.HttpsError("invalid-argument", f"Error parsing task data: {e}")
 
+    # Tasks carry their story's epic_id so they can be queried by epic. The
+    # story is read uncached, as a cached copy may predate a move to another epic
+    if task.story_id:
+        story = get_doc_by_id_from_db(
+            "stories", task.story_id, ["epic_id"], use_cache=False
+        )
+        if not story:
+            raise https_fn.HttpsError("not-found", "Story not found")
+        task.epic_id = story.to_dict().get("epic_id")
+
+    # The story and epic rollups are updated by on_task_written
     try:
-        task_ref = Task.to_firestore(task, firestore.client())
+        upload_item("tasks", task)
     except Exception as e:
         raise https_fn.HttpsError("internal", f"Error uploading task: {e}")
-
-    # Update the story to include this task in its child_tasks
-    if task.story_id != "":
-        try:
-            story = get_stories_from_db({"id": task.story_id})[0]
-            if not story:
-                raise https_fn.HttpsError("not-found", "Story not found")
-
-            story = patch_story_in_db_with_fields(
-                id=story.id,
-                update_data={"child_tasks": story.child_tasks + [task.id]},
-            )
-        except Exception as e:
-            task_ref.delete()
-            raise https_fn.HttpsError(
-                "internal", f"Error updating story with new task: {e}"
-            )
     return task.to_dict()
 
 
 @https_fn.on_request()
+@instrumented
 def get_tasks(req: https_fn.Request) -> https_fn.Response:
     creator_id = req.args.get("creator_id", None)
     assigned_user_id = req.args.get("assigned_user_id", None)
@@ -219,11 +315,11 @@ def get_tasks(req: https_fn.Request) -> https_fn.Response:
         "status": status,
     }
     # Fetch tasks for the user from your database or other service
-    tasks = get_tasks_from_db(query_params)
-    return [task.to_dict() for task in tasks]
+    return list_response(req, "tasks", query_params, Task)
 
 
 @https_fn.on_request()
+@instrumented
 def get_tasks_from_epic(req: https_fn.Request) -> https_fn.Response:
     id = req.args.get("id", None)
     if not id:
@@ -234,25 +330,12 @@ def get_tasks_from_epic(req: https_fn.Request) -> https_fn.Response:
         "epic_id": id,
         "status": status,
     }
-    # Fetch stories for the epic
-    print("Fetching stories with query params:", query_params)
-    stories_from_epic = get_stories_from_db(query_params)
-
-    # Fetch tasks for each story
-    tasks = []
-    for story in stories_from_epic:
-        story_id = story.id
-        if story_id:
-            story_query_params = {
-                "story_id": story_id,
-                "status": status,
-            }
-            story_tasks = get_tasks_from_db(story_query_params)
-            tasks.extend(story_tasks)
-    return [task.to_dict() for task in tasks]
+    # Tasks carry a denormalized epic_id, so this is a single query
+    return list_response(req, "tasks", query_params, Task)
 
 
 @https_fn.on_request()
+@instrumented
 def update_task(req: https_fn.Request) -> https_fn.Response:
     if req.method != "PATCH":
         raise https_fn.HttpsError("invalid-argument", "Invalid request method")
@@ -266,14 +349,755 @@ def update_task(req: https_fn.Request) -> https_fn.Response:
         raise https_fn.HttpsError("invalid-argument", "No data provided for update")
     try:
         return patch_task_in_db_with_fields(id, update_data).to_dict()
+    except DocumentNotFound as e:
+        raise https_fn.HttpsError("not-found", str(e))
+    except ValueError as e:
+        raise https_fn.HttpsError("invalid-argument", f"Invalid update: {e}")
     except Exception as e:
         raise https_fn.HttpsError("internal", f"Error updating task: {e}")
 
 
+# ========== BULK ==========
+@https_fn.on_call()
+@instrumented
+def bulk_upload_epics(request: https_fn.CallableRequest) -> https_fn.Response:
+    return {"results": bulk_upload_items("epics", parse_bulk_items(request.data))}
+
+
+@https_fn.on_call()
+@instrumented
+def bulk_upload_stories(request: https_fn.CallableRequest) -> https_fn.Response:
+    return {"results": bulk_upload_items("stories", parse_bulk_items(request.data))}
+
+
+@https_fn.on_call()
+@instrumented
+def bulk_upload_tasks(request: https_fn.CallableRequest) -> https_fn.Response:
+    return {"results": bulk_upload_items("tasks", parse_bulk_items(request.data))}
+
+
+@https_fn.on_request()
+@instrumented
+def bulk_update_epics(req: https_fn.Request) -> https_fn.Response:
+    return bulk_update_response(req, "epics")
+
+
+@https_fn.on_request()
+@instrumented
+def bulk_update_stories(req: https_fn.Request) -> https_fn.Response:
+    return bulk_update_response(req, "stories")
+
+
+@https_fn.on_request()
+@instrumented
+def bulk_update_tasks(req: https_fn.Request) -> https_fn.Response:
+    return bulk_update_response(req, "tasks")
+
+
+# ========= HELPERS FOR BULK ==========
+def parse_bulk_items(data) -> list:
+    # Accept either a bare array or {"items": [...]}
+    items = data.get("items") if isinstance(data, dict) else data
+    if not isinstance(items, list) or not items:
+        raise https_fn.HttpsError("invalid-argument", "items must be a non-empty list")
+    if len(items) > MAX_BULK_ITEMS:
+        raise https_fn.HttpsError(
+            "invalid-argument", f"At most {MAX_BULK_ITEMS} items per call"
+        )
+    return items
+
+
+def bulk_update_response(req: https_fn.Request, collection: str) -> https_fn.Response:
+    # Body: {"data": [{"id": ..., "data": {...fields to update}}, ...]}
+    if req.method != "PATCH":
+        raise https_fn.HttpsError("invalid-argument", "Invalid request method")
+    updates = parse_bulk_items(json.loads(req.data).get("data"))
+    return {"results": bulk_update_items(collection, updates)}
+
+
+def bulk_upload_items(collection: str, items: list) -> list:
+    # Validate every item with from_dict, drop items whose parent does not
+    # exist, then write the rest through a BulkWriter. Rollups follow from
+    # the triggers. New items are created; items whose caller-supplied id
+    # already exists are merged into the stored document, which keeps its
+    # created_at and progress rollup. Returns one result per input item
+    model, parent_collection, parent_field = HIERARCHY[collection]
+    results = [None] * len(items)
+    valid = {}
+    seen = set()
+    for index, data in enumerate(items):
+        try:
+            item = model.from_dict(data, id=data.get("id"))
+        except Exception as e:
+            results[index] = bulk_result(index, None, f"Error parsing data: {e}")
+            continue
+        # Ids and parent ids were checked by from_dict, so every read below is
+        # a valid key and one bad item cannot fail the others
+        if item.id in seen:
+            results[index] = bulk_result(index, item.id, "Duplicate id")
+            continue
+        seen.add(item.id)
+        valid[index] = item
+
+    db = get_client()
+    writes = []
+    supplied_ids = [item.id for index, item in valid.items() if items[index].get("id")]
+    current = {
+        doc.id: doc.to_dict()
+        for doc in get_docs_by_ids_from_db(collection, supplied_ids, use_cache=False)
+    }
+    parents = get_parents(
+        parent_collection,
+        (
+            [getattr(item, parent_field) for item in valid.values()]
+            if parent_field
+            else []
+        ),
+    )
+    for index, item in valid.items():
+        parent_id = getattr(item, parent_field) if parent_field else None
+        if parent_id and parent_id not in parents:
+            results[index] = bulk_result(index, item.id, "Parent not found")
+            continue
+        if collection == "tasks":
+            item.epic_id = parents[parent_id].get("epic_id") if parent_id else None
+        method = "create"
+        if item.id in current:
+            method = "merge"
+            item.created_at = current[item.id].get("created_at", item.created_at)
+        writes.append((method, db.collection(collection).document(item.id), item))
+
+    errors = run_bulk_writes(
+        [(method, ref, item.to_dict()) for method, ref, item in writes]
+        + [
+            search_index_write(collection, item.id, item.to_dict())
+            for *_, item in writes
+        ]
+    )
+    for index, item in valid.items():
+        if results[index] is None:
+            error = errors.get(f"{collection}/{item.id}")
+            results[index] = bulk_result(index, item.id, error)
+    return results
+
+
+def bulk_update_items(collection: str, updates: list) -> list:
+    # Validate each partial update against the model schema with
+    # validate_update, then write through a BulkWriter. Rollups and the
+    # epic_id of moved stories' tasks follow from the triggers
+    model, parent_collection, parent_field = HIERARCHY[collection]
+    results = [None] * len(updates)
+    entries = {}
+    seen = set()
+    for index, entry in enumerate(updates):
+        if (
+            not isinstance(entry, dict)
+            or not isinstance(entry.get("id"), str)
+            or not entry["id"]
+            or not isinstance(entry.get("data"), dict)
+            or not entry["data"]
+        ):
+            results[index] = bulk_result(index, None, "id and data are required")
+            continue
+        # Validated before any read, so every id and parent id read is a valid
+        # key and one bad entry cannot fail the others
+        try:
+            check_document_id(entry["id"])
+            validate_update(model, entry["data"])
+        except ValueError as e:
+            results[index] = bulk_result(index, entry["id"], f"Error parsing data: {e}")
+            continue
+        if entry["id"] in seen:
+            results[index] = bulk_result(index, entry["id"], "Duplicate id")
+            continue
+        seen.add(entry["id"])
+        entries[index] = entry
+
+    db = get_client()
+    current = {
+        doc.id: doc.to_dict()
+        for doc in get_docs_by_ids_from_db(
+            collection, [entry["id"] for entry in entries.values()], use_cache=False
+        )
+    }
+    parents = get_parents(
+        parent_collection,
+        [entry["data"].get(parent_field) for entry in entries.values()],
+    )
+    writes = []
+    for index, entry in list(entries.items()):
+        id, update_data = entry["id"], entry["data"]
+        if id not in current:
+            results[index] = bulk_result(index, id, "Not found")
+            continue
+        new_parent = update_data.get(parent_field) if parent_field else None
+        if new_parent and new_parent not in parents:
+            results[index] = bulk_result(index, id, "Parent not found")
+            continue
+        if collection == "tasks":
+            update_data = with_task_epic_id(
+                update_data, parents.get(update_data.get("story_id"))
+            )
+        writes.append(("update", db.collection(collection).document(id), update_data))
+        if touches_index(update_data):
+            writes.append(
+                search_index_write(collection, id, {**current[id], **update_data})
+            )
+
+    errors = run_bulk_writes(writes)
+    for index, entry in entries.items():
+        if results[index] is None:
+            id = entry["id"]
+            results[index] = bulk_result(index, id, errors.get(f"{collection}/{id}"))
+    return results
+
+
+def get_parents(parent_collection: str, parent_ids: list) -> dict:
+    # Fetch all referenced parents with one batched read, keyed by id. Stories
+    # are read uncached because tasks copy their current epic_id
+    if not parent_collection:
+        return {}
+    use_cache = parent_collection != "stories"
+    return {
+        doc.id: doc.to_dict()
+        for doc in get_docs_by_ids_from_db(parent_collection, parent_ids, use_cache)
+    }
+
+
+def rollup_writes(deltas: dict) -> list:
+    # Turn rollup deltas into one Increment update per story/epic
+    from google.cloud.firestore import Increment
+    from google.cloud.firestore_v1.field_path import FieldPath
+
+    db = get_client()
+    writes = []
+    for (collection, id), counts in nonzero(deltas).items():
+        update = {
+            FieldPath("progress", *path).to_api_repr(): Increment(count)
+            for path, count in counts.items()
+        }
+        writes.append(("update", db.collection(collection).document(id), update))
+    return writes
+
+
+def run_bulk_writes(writes: list, stamp: bool = True) -> dict:
+    # Run (method, ref, data) writes through a BulkWriter and return the error
+    # message of every write that failed for good, keyed by document path.
+    # Every write also stamps updated_at, unless stamp is False for writes
+    # that only touch fields list responses leave out, such as progress.
+    # "merge" is a set with merge=True
+    errors = {}
+    if not writes:
+        return errors
+
+    def on_write_error(failure, _bulk_writer) -> bool:
+        retry = (
+            failure.code in BULK_RETRYABLE_CODES
+            and failure.attempts < BULK_MAX_ATTEMPTS
+        )
+        if not retry:
+            errors[failure.operation.reference.path] = failure.message
+        return retry
+
+    bulk_writer = get_client().bulk_writer()
+    bulk_writer.on_write_error(on_write_error)
+    for method, ref, data in writes:
+        data = stamped(data) if stamp else data
+        if method == "merge":
+            bulk_writer.set(ref, data, merge=True)
+        else:
+            getattr(bulk_writer, method)(ref, data)
+    bulk_writer.close()
+    record(writes=len(writes))
+    for _, ref, _ in writes:
+        entity_cache.delete(ref.path)
+    return errors
+
+
+def bulk_result(index: int, id: str, error: str = None) -> dict:
+    if error:
+        return {"index": index, "id": id, "status": "error", "error": error}
+    return {"index": index, "id": id, "status": "ok"}
+
+
+# ========== PROGRESS ==========
+@https_fn.on_request()
+@instrumented
+def get_epic_progress(req: https_fn.Request) -> https_fn.Response:
+    """Returns task counts by status and the overdue count for an epic, or for
+    a story with story_id="""
+    id = req.args.get("id", None)
+    story_id = req.args.get("story_id", None)
+    if not id and not story_id:
+        raise https_fn.HttpsError("invalid-argument", "id or story_id is required")
+    collection = "stories" if story_id else "epics"
+    doc_ref = get_client().collection(collection).document(story_id or id)
+    doc = doc_ref.get(["progress"])
+    record(reads=1)
+    if not doc.exists:
+        raise https_fn.HttpsError("not-found", "Not found")
+    return {"id": doc.id, **summarize(doc.to_dict().get("progress"))}
+
+
+# ========== MAINTENANCE ==========
+@https_fn.on_request()
+@instrumented
+def repair_progress_rollups(req: https_fn.Request) -> https_fn.Response:
+    """Rebuilds the progress rollups of one page of epics and their stories
+    from their tasks (run backfill_task_epic_ids first). Call again with the
+    returned next_page_token until it is null"""
+    if req.method != "POST":
+        raise https_fn.HttpsError("invalid-argument", "Invalid request method")
+    limit = page_limit(req, 20, MAX_MAINTENANCE_PAGE_SIZE)
+    page_token = req.args.get("page_token", None)
+
+    db = get_client()
+    epics_query = db.collection("epics").select([DOCUMENT_ID])
+    epics = stream_docs(paginate_query(epics_query, limit, page_token))
+
+    # Fetch the tasks and stories of every epic in the page concurrently
+    client = async_db.get_async_client()
+    task_fields = ["status", "due_date", "story_id"]
+    queries = []
+    for epic in epics:
+        tasks_query = client.collection("tasks").where("epic_id", "==", epic.id)
+        stories_query = client.collection("stories").where("epic_id", "==", epic.id)
+        queries.append(async_db.stream(tasks_query.select(task_fields)))
+        queries.append(async_db.stream(stories_query.select([DOCUMENT_ID])))
+    results = async_db.run(async_db.gather_bounded(queries))
+
+    writes = []
+    for index, epic in enumerate(epics):
+        tasks = [doc.to_dict() for doc in results[2 * index]]
+        tasks_by_story = defaultdict(list)
+        for task in tasks:
+            tasks_by_story[task.get("story_id")].append(task)
+        for story in results[2 * index + 1]:
+            progress = build_progress(tasks_by_story.get(story.id, []))
+            story_ref = db.collection("stories").document(story.id)
+            writes.append(("update", story_ref, {"progress": progress}))
+        epic_ref = db.collection("epics").document(epic.id)
+        writes.append(("update", epic_ref, {"progress": build_progress(tasks)}))
+    errors = run_bulk_writes(writes, stamp=False)
+    return {
+        "repaired": len(epics),
+        "errors": errors,
+        "next_page_token": epics[-1].id if len(epics) == limit else None,
+    }
+
+
+@https_fn.on_request()
+@instrumented
+def backfill_task_epic_ids(req: https_fn.Request) -> https_fn.Response:
+    """Sets epic_id on the tasks of one page of stories. Call again with the
+    returned next_page_token until it is null"""
+    if req.method != "POST":
+        raise https_fn.HttpsError("invalid-argument", "Invalid request method")
+    limit = page_limit(req, 200, MAX_MAINTENANCE_PAGE_SIZE)
+    page_token = req.args.get("page_token", None)
+
+    stories_query = get_client().collection("stories").select(["epic_id"])
+    stories = stream_docs(paginate_query(stories_query, limit, page_token))
+    updated = sync_task_epic_ids(
+        {story.id: story.to_dict().get("epic_id") for story in stories}
+    )
+    return {
+        "updated": updated,
+        "next_page_token": stories[-1].id if len(stories) == limit else None,
+    }
+
+
+@https_fn.on_request()
+@instrumented
+def migrate_child_id_arrays(req: https_fn.Request) -> https_fn.Response:
+    """Moves one page of epics (collection=epics) or stories
+    (collection=stories) off their child id arrays: children listed in an
+    array that have no parent id of their own are pointed at the parent, then
+    the array is deleted. Call again with the returned next_page_token until
+    it is null, epics first, then run backfill_task_epic_ids"""
+    from google.cloud.firestore import DELETE_FIELD
+
+    if req.method != "POST":
+        raise https_fn.HttpsError("invalid-argument", "Invalid request method")
+    collection = req.args.get("collection", "epics")
+    if collection not in LEGACY_CHILD_ARRAYS:
+        raise https_fn.HttpsError(
+            "invalid-argument", "collection must be epics or stories"
+        )
+    limit = page_limit(req, 100, MAX_MAINTENANCE_PAGE_SIZE)
+    page_token = req.args.get("page_token", None)
+    child_collection, array_field = LEGACY_CHILD_ARRAYS[collection]
+    parent_field = HIERARCHY[child_collection][2]
+
+    db = get_client()
+    parents_query = db.collection(collection).select([array_field, "epic_id"])
+    parents = stream_docs(paginate_query(parents_query, limit, page_token))
+    parent_of = {}
+    for parent in parents:
+        for child_id in parent.to_dict().get(array_field) or []:
+            parent_of.setdefault(child_id, parent)
+
+    # A child's own parent id wins over a stale entry in an array
+    child_writes = []
+    children = get_docs_by_ids_from_db(
+        child_collection, list(parent_of), use_cache=False
+    )
+    for child in children:
+        if child.to_dict().get(parent_field):
+            continue
+        parent = parent_of[child.id]
+        update = {parent_field: parent.id}
+        if child_collection == "tasks":
+            update["epic_id"] = parent.to_dict().get("epic_id")
+        ref = db.collection(child_collection).document(child.id)
+        child_writes.append(("update", ref, update))
+    errors = run_bulk_writes(child_writes)
+
+    # Keep the arrays of parents whose children could not be linked, so that
+    # the next run retries them
+    failed = {parent_of[ref.id].id for _, ref, _ in child_writes if ref.path in errors}
+    errors.update(
+        run_bulk_writes(
+            [
+                (
+                    "update",
+                    db.collection(collection).document(parent.id),
+                    {array_field: DELETE_FIELD},
+                )
+                for parent in parents
+                if array_field in parent.to_dict() and parent.id not in failed
+            ]
+        )
+    )
+    return {
+        "migrated": len(parents) - len(failed),
+        "linked": len(child_writes),
+        "errors": errors,
+        "next_page_token": parents[-1].id if len(parents) == limit else None,
+    }
+
+
+# ========== TRIGGERS ==========
+# Firestore delivers each event at least once and, with retries enabled on the
+# deployed functions, again after a failure, so both triggers are idempotent.
+# Retries are a deployment setting: the Python SDK has no option for them
+@firestore_fn.on_document_written(document="stories/{id}")
+@instrumented
+def on_story_written(event: firestore_fn.Event) -> None:
+    """Points the tasks of a story moved to another epic at the new epic. Each
+    task's own trigger then moves its rollup contribution between the epics"""
+    before, after = event_data(event)
+    if not before or not after or before.get("epic_id") == after.get("epic_id"):
+        return
+    # Follow the story as currently stored, so that moves delivered late or
+    # out of order still leave the tasks on its latest epic
+    id = event.params["id"]
+    story = get_client().collection("stories").document(id).get(["epic_id"])
+    record(reads=1)
+    if story.exists:
+        sync_task_epic_ids({id: story.to_dict().get("epic_id")})
+
+
+@firestore_fn.on_document_written(document="tasks/{id}")
+@instrumented
+def on_task_written(event: firestore_fn.Event) -> None:
+    """Keeps the story and epic progress rollups and the assignees' schedules
+    in step with a task"""
+    before, after = event_data(event)
+    deltas = task_deltas(before, after)
+    if nonzero(deltas):
+        apply_rollup_deltas(event.id, deltas)
+    if schedule_changed(before, after):
+        # Schedule entries are replaced, not incremented, so they follow the
+        # task as currently stored for events delivered late or out of order
+        id = event.params["id"]
+        doc = get_client().collection("tasks").document(id).get()
+        record(reads=1)
+        current = {**doc.to_dict(), "id": id} if doc.exists else None
+        refresh_schedules([({**before, "id": id} if before else None, current)])
+
+
+# ========= HELPERS FOR TRIGGERS ==========
+def event_data(event: firestore_fn.Event) -> tuple:
+    # (before, after) data of a document write, None where the document does
+    # not exist
+    return tuple(
+        snapshot.to_dict() if snapshot is not None and snapshot.exists else None
+        for snapshot in (event.data.before, event.data.after)
+    )
+
+
+def schedule_changed(before: dict | None, after: dict | None) -> bool:
+    fields = ENTRY_FIELDS + ("assigned_user_id",)
+    return any(
+        (before or {}).get(field) != (after or {}).get(field) for field in fields
+    ) or (before is None) != (after is None)
+
+
+def apply_rollup_deltas(event_id: str, deltas: dict) -> None:
+    # Increment the rollups exactly once per event: the updates commit in one
+    # transaction with a marker named after the event, and an event whose
+    # marker exists was already applied. Stories and epics that no longer
+    # exist are skipped
+    from google.cloud.firestore import transactional
+
+    db = get_client()
+    marker_ref = db.collection(TRIGGER_EVENTS).document(event_id)
+    writes = rollup_writes(deltas)
+
+    @transactional
+    def apply(transaction) -> list:
+        refs = [marker_ref] + [ref for _, ref, _ in writes]
+        docs = {
+            doc.reference.path: doc for doc in db.get_all(refs, transaction=transaction)
+        }
+        if docs[marker_ref.path].exists:
+            return []
+        written = []
+        for _, ref, data in writes:
+            if not docs[ref.path].exists:
+                logger.warning("Skipping rollup of missing %s", ref.path)
+                continue
+            # Progress is not part of the list responses, so updated_at is
+            # left alone and the parents' ETags and since= tokens hold
+            transaction.update(ref, data)
+            written.append(ref.path)
+        expires_at = datetime.now(timezone.utc) + TRIGGER_EVENT_TTL
+        transaction.create(marker_ref, {"expires_at": expires_at})
+        return written + [marker_ref.path]
+
+    written = apply(db.transaction())
+    record(reads=1 + len(writes), writes=len(written))
+    for path in written:
+        entity_cache.delete(path)
+
+
+# ========== BACKUP ==========
+@https_fn.on_request()
+@instrumented
+def export_workspace(req: https_fn.Request) -> https_fn.Response:
+    """Streams a gzip NDJSON backup of epics with their stories and tasks.
+    epic_ids=a,b or creator_id= / assigned_user_id= select the epics; without
+    them the whole database is exported"""
+    epic_ids = [id for id in req.args.get("epic_ids", "").split(",") if id]
+    filters = {
+        "creator_id": req.args.get("creator_id", None),
+        "assigned_user_id": req.args.get("assigned_user_id", None),
+    }
+    return https_fn.Response(
+        gzip_chunks(export_records(epic_ids, filters)),
+        mimetype="application/gzip",
+        headers={"Content-Disposition": "attachment; filename=workspace.ndjson.gz"},
+    )
+
+
+@https_fn.on_request()
+@instrumented
+def import_workspace(req: https_fn.Request) -> https_fn.Response:
+    """Restores a backup written by export_workspace from the request body,
+    gzip or plain NDJSON. Documents are written as exported over any with the
+    same id, and the triggers rebuild the progress rollups from the restored
+    tasks. Schedules are not touched; rebuild them with update_schedule
+    afterwards"""
+    if req.method != "POST":
+        raise https_fn.HttpsError("invalid-argument", "Invalid request method")
+    return import_records(read_lines(req.stream))
+
+
+# ========= HELPERS FOR BACKUP ==========
+def export_records(epic_ids: list = None, filters: dict = None):
+    # Yield backup lines, reading documents a page at a time
+    selected = epic_ids or any((filters or {}).values())
+    if not selected:
+        for collection in COLLECTIONS:
+            for doc in paged_docs(get_client().collection(collection)):
+                yield encode_record(collection, doc)
+        return
+
+    if epic_ids:
+        epics = (
+            doc
+            for i in range(0, len(epic_ids), EXPORT_PAGE_SIZE)
+            for doc in get_docs_by_ids_from_db(
+                "epics", epic_ids[i : i + EXPORT_PAGE_SIZE], use_cache=False
+            )
+        )
+    else:
+        epics = paged_docs(build_query("epics", filters))
+    for epic in epics:
+        yield encode_record("epics", epic)
+        for collection in ("stories", "tasks"):
+            query = build_query(collection, {"epic_id": epic.id})
+            for doc in paged_docs(query):
+                yield encode_record(collection, doc)
+
+
+def paged_docs(query, page_size: int = EXPORT_PAGE_SIZE):
+    # Iterate over every result of query, holding one page in memory
+    page_token = None
+    while True:
+        docs = stream_docs(paginate_query(query, page_size, page_token))
+        yield from docs
+        if len(docs) < page_size:
+            return
+        page_token = docs[-1].id
+
+
+def import_records(lines) -> dict:
+    # Validate and write backup lines through the bulk writer, one batch of
+    # IMPORT_BATCH_SIZE documents at a time. Each document's search entry is
+    # rewritten with it. Documents are merged so that the rollups of existing
+    # stories and epics are kept and only the task changes are applied to them
+    db = get_client()
+    models = {collection: HIERARCHY[collection][0] for collection in COLLECTIONS}
+    written = dict.fromkeys(COLLECTIONS, 0)
+    errors = []
+    error_count = 0
+    writes = []
+
+    def flush() -> None:
+        nonlocal error_count
+        failed = run_bulk_writes(writes)
+        for _, ref, _ in writes:
+            collection = ref.parent.id
+            if collection not in written:
+                continue
+            if ref.path in failed:
+                error_count += 1
+                if len(errors) < MAX_IMPORT_ERRORS:
+                    errors.append({"id": ref.id, "error": failed[ref.path]})
+            else:
+                written[collection] += 1
+        writes.clear()
+
+    for line_number, line in enumerate(lines, 1):
+        try:
+            collection, id, data = decode_record(line, models)
+        except ValueError as e:
+            error_count += 1
+            if len(errors) < MAX_IMPORT_ERRORS:
+                errors.append({"line": line_number, "error": str(e)})
+            continue
+        writes.append(("merge", db.collection(collection).document(id), data))
+        writes.append(search_index_write(collection, id, data))
+        if len(writes) >= 2 * IMPORT_BATCH_SIZE:
+            flush()
+    flush()
+    return {"written": written, "error_count": error_count, "errors": errors}
+
+
+# ========== SEARCH ==========
+@https_fn.on_request()
+@instrumented
+def search(req: https_fn.Request) -> https_fn.Response:
+    """Searches the names and descriptions of epics, stories and tasks. q is
+    the query; its last word also matches as a prefix while it is being typed.
+    collection= limits the search to epics, stories or tasks. Results are
+    ranked best first and paged with limit and page_token"""
+    terms, prefix = parse_query(req.args.get("q", ""))
+    if not terms and (not prefix or len(prefix) < MIN_PREFIX):
+        raise https_fn.HttpsError(
+            "invalid-argument", f"q needs a word of at least {MIN_PREFIX} characters"
+        )
+    collection = req.args.get("collection", None)
+    if collection and collection not in HIERARCHY:
+        raise https_fn.HttpsError(
+            "invalid-argument", f"Unknown collection: {collection}"
+        )
+    try:
+        limit = int(req.args.get("limit", "20"))
+        offset = int(req.args.get("page_token", "0"))
+    except ValueError:
+        raise https_fn.HttpsError("invalid-argument", "Invalid limit or page_token")
+    if not 0 < limit <= MAX_SEARCH_PAGE or offset < 0:
+        raise https_fn.HttpsError(
+            "invalid-argument", f"limit must be between 1 and {MAX_SEARCH_PAGE}"
+        )
+
+    results = search_items(
+        [collection] if collection else list(HIERARCHY), terms, prefix
+    )
+    end = offset + limit
+    return {
+        "results": results[offset:end],
+        "next_page_token": str(end) if end < len(results) else None,
+    }
+
+
+@https_fn.on_request()
+@instrumented
+def rebuild_search_index(req: https_fn.Request) -> https_fn.Response:
+    """Rewrites the search entries of one page of a collection (collection=
+    epics, stories or tasks). Call again with the returned next_page_token
+    until it is null"""
+    if req.method != "POST":
+        raise https_fn.HttpsError("invalid-argument", "Invalid request method")
+    collection = req.args.get("collection", None)
+    if collection not in HIERARCHY:
+        raise https_fn.HttpsError("invalid-argument", "collection is required")
+    limit = page_limit(req, 500, MAX_MAINTENANCE_PAGE_SIZE)
+    page_token = req.args.get("page_token", None)
+
+    query = get_client().collection(collection).select(list(FIELD_WEIGHTS))
+    docs = stream_docs(paginate_query(query, limit, page_token))
+    errors = run_bulk_writes(
+        [search_index_write(collection, doc.id, doc.to_dict()) for doc in docs]
+    )
+    return {
+        "indexed": len(docs) - len(errors),
+        "errors": errors,
+        "next_page_token": docs[-1].id if len(docs) == limit else None,
+    }
+
+
+# ========= HELPERS FOR SEARCH ==========
+def search_index_write(collection: str, id: str, item: dict) -> tuple:
+    ref = get_client().collection(index_collection(collection)).document(id)
+    return ("set", ref, index_entry(item))
+
+
+def search_items(collections: list, terms: list, prefix: str | None) -> list:
+    # One array_contains lookup per collection, run concurrently, then every
+    # term is checked and scored against the candidates' weights
+    field, value = lookup_term(terms, prefix)
+    client = async_db.get_async_client()
+    queries = [
+        async_db.stream(
+            client.collection(index_collection(collection))
+            .where(field, "array_contains", value)
+            .select(["name", "weights"])
+            .limit(MAX_SEARCH_CANDIDATES)
+        )
+        for collection in collections
+    ]
+    results = async_db.run(async_db.gather_bounded(queries))
+    return rank(
+        (
+            (collection, doc.id, doc.to_dict())
+            for collection, docs in zip(collections, results)
+            for doc in docs
+        ),
+        terms,
+        prefix,
+    )
+
+
 # ========= USER MANAGEMENT ==========
 @https_fn.on_request()
+@instrumented
 def get_uid(req: https_fn.Request):
-    """A function that gets the UID of a user based on their email"""
+    """A function that gets the UID of a user based on their email.
+    emails=a@x.com,b@x.com resolves many at once to {"uids": {email: uid}},
+    with null for unknown emails"""
+    emails = req.args.get("emails")
+    if emails:
+        emails = [email.strip() for email in emails.split(",") if email.strip()]
+        if len(emails) > MAX_UID_LOOKUPS:
+            return https_fn.Response(
+                f"At most {MAX_UID_LOOKUPS} emails per request", status=400
+            )
+        return {"uids": fetch_uids_by_emails(emails)}
+
     email = req.args.get("email")
     if not email:
         return https_fn.Response("Missing email", status=400)
@@ -286,106 +1110,328 @@ def get_uid(req: https_fn.Request):
 
 
 def fetch_uid_by_email(email: str) -> str:
-    try:
-        user = auth.get_user_by_email(email)
-        return user.uid
-    except auth.UserNotFoundError:
-        return None
+    return fetch_uids_by_emails([email])[email]
+
+
+def fetch_uids_by_emails(emails: list) -> dict:
+    # Resolve emails to UIDs, serving known and unknown emails from the UID
+    # caches and looking up the rest with get_users, 100 emails per call
+    uids = {}
+    misses = []
+    for email in dict.fromkeys(emails):
+        key = email.lower()
+        uid = uid_cache.get(key)
+        if uid is MISSING and missing_uid_cache.get(key) is MISSING:
+            misses.append(email)
+        else:
+            uids[email] = None if uid is MISSING else uid
+
+    if misses:
+        auth = get_auth()
+        for i in range(0, len(misses), AUTH_BATCH_SIZE):
+            chunk = misses[i : i + AUTH_BATCH_SIZE]
+            result = auth.get_users([auth.EmailIdentifier(email) for email in chunk])
+            found = {user.email.lower(): user.uid for user in result.users}
+            for email in chunk:
+                key = email.lower()
+                uids[email] = found.get(key)
+                if key in found:
+                    uid_cache.set(key, found[key])
+                else:
+                    missing_uid_cache.set(key, None)
+    return uids
 
 
 # Helpers
-def get_tasks_from_db(query_params: dict) -> list:
-    # Fetch tasks from Firestore based on the query parameters
-    db = firestore.client()
-    tasks_ref = db.collection("tasks")
-
-    if query_params.get("creator_id"):
-        tasks_ref = tasks_ref.where("creator_id", "==", query_params["creator_id"])
-    if query_params.get("assigned_user_id"):
-        tasks_ref = tasks_ref.where(
-            "assigned_user_id", "==", query_params["assigned_user_id"]
+@instrumented
+def get_doc_by_id_from_db(
+    collection: str, id: str, field_paths: list = None, use_cache=True
+):
+    # Point read, served from the entity cache when possible. Returns None when
+    # the document is missing. field_paths projects the result
+    return get_repo(collection).get(id, field_paths, use_cache)
+
+
+@instrumented
+def get_docs_by_ids_from_db(collection: str, ids: list, use_cache=True) -> list:
+    # Batched point reads. Missing documents are skipped and the result keeps
+    # the order of the given ids
+    return get_repo(collection).get_many(ids, use_cache)
+
+
+def upload_item(collection: str, item) -> None:
+    # Write item and its search entry in a single batch. A task's rollups are
+    # updated by its trigger afterwards
+    db = get_client()
+    _, search_ref, entry = search_index_write(collection, item.id, item.to_dict())
+    batch = db.batch()
+    batch.set(db.collection(collection).document(item.id), stamped(item.to_dict()))
+    batch.set(search_ref, stamped(entry))
+    batch.commit()
+    record(writes=len(batch))
+    entity_cache.set(entity_key(collection, item.id), item.to_dict())
+    entity_cache.delete(search_ref.path)
+
+
+@instrumented
+def get_task_docs_for_stories_from_db(
+    story_ids: list, status: str = None, field_paths: list = None
+) -> list:
+    # Fetch task documents belonging to any of the given stories with chunked
+    # "in" queries run concurrently. field_paths limits the fields transferred
+    if not story_ids:
+        return []
+    return async_db.run(
+        async_db.query_in_chunks(
+            "tasks", "story_id", list(story_ids), {"status": status}, field_paths
         )
-    if query_params.get("epic_id"):
-        tasks_ref = tasks_ref.where("epic_id", "==", query_params["epic_id"])
-    if query_params.get("story_id"):
-        tasks_ref = tasks_ref.where("story_id", "==", query_params["story_id"])
-    if query_params.get("status"):
-        tasks_ref = tasks_ref.where("status", "==", query_params["status"])
-    if query_params.get("id"):
-        tasks_ref = tasks_ref.where("id", "==", query_params["id"])
-
-    return [Task.from_firestore(doc) for doc in tasks_ref.stream()]
-
-
-def patch_task_in_db_with_fields(id: str, update_data: dict) -> None:
-    db = firestore.client()
-    task_ref = db.collection("tasks").document(id)
-    # Only update the fields provided in update_data
-    task_ref.update(update_data)
-    task = Task.from_firestore(task_ref.get())
-    return task
-
-
-def get_stories_from_db(query_params: dict) -> list:
-    # Fetch stories from Firestore based on the query parameters
-    db = firestore.client()
-    stories_ref = db.collection("stories")
-
-    if query_params.get("creator_id"):
-        stories_ref = stories_ref.where("creator_id", "==", query_params["creator_id"])
-    if query_params.get("assigned_user_id"):
-        stories_ref = stories_ref.where(
-            "assigned_user_id", "==", query_params["assigned_user_id"]
+    )
+
+
+@instrumented
+def patch_task_in_db_with_fields(id: str, update_data: dict) -> Task:
+    update_data = validate_update(Task, update_data)
+    if "story_id" in update_data or "epic_id" in update_data:
+        story_id = update_data.get("story_id")
+        story = (
+            get_doc_by_id_from_db("stories", story_id, use_cache=False)
+            if story_id
+            else None
         )
-    if query_params.get("epic_id"):
-        stories_ref = stories_ref.where("epic_id", "==", query_params["epic_id"])
-    if query_params.get("status"):
-        stories_ref = stories_ref.where("status", "==", query_params["status"])
-    if query_params.get("story_id"):
-        stories_ref = stories_ref.where("story_id", "==", query_params["story_id"])
-
-    return [Story.from_firestore(doc) for doc in stories_ref.stream()]
-
-
-def patch_story_in_db_with_fields(id: str, update_data: dict) -> None:
-    db = firestore.client()
-    story_ref = db.collection("stories").document(id)
-    # Only update the fields provided in update_data
-    story_ref.update(update_data)
-    story = Story.from_firestore(story_ref.get())
-    return story
-
-
-def get_epics_from_db(query_params: dict) -> list:
-    # Fetch epics from Firestore based on the query parameters
-    db = firestore.client()
-    epics_ref = db.collection("epics")
-
-    if query_params.get("creator_id"):
-        epics_ref = epics_ref.where("creator_id", "==", query_params["creator_id"])
-    if query_params.get("assigned_user_id"):
-        epics_ref = epics_ref.where(
-            "assigned_user_id", "==", query_params["assigned_user_id"]
+        if story_id and not story:
+            raise DocumentNotFound(f"Story {story_id} not found")
+        update_data = with_task_epic_id(update_data, story.to_dict() if story else None)
+
+    # The rollups and schedules are updated by on_task_written
+    return patch_document("tasks", Task, id, update_data)
+
+
+def with_task_epic_id(update_data: dict, story: dict | None) -> dict:
+    # A task's epic_id is derived from its story and cannot be set directly
+    update_data = {k: v for k, v in update_data.items() if k != "epic_id"}
+    if "story_id" in update_data:
+        update_data["epic_id"] = story.get("epic_id") if story else None
+    return update_data
+
+
+def sync_task_epic_ids(story_epic_ids: dict) -> int:
+    # Point the tasks of each story at the story's epic, skipping tasks that
+    # are already up to date. Returns the number of tasks updated
+    docs = get_task_docs_for_stories_from_db(
+        list(story_epic_ids), field_paths=["story_id", "epic_id"]
+    )
+    tasks_ref = get_client().collection("tasks")
+    writes = []
+    for doc in docs:
+        data = doc.to_dict()
+        epic_id = story_epic_ids[data["story_id"]]
+        if data.get("epic_id") != epic_id:
+            writes.append(("update", tasks_ref.document(doc.id), {"epic_id": epic_id}))
+    run_bulk_writes(writes)
+    return len(writes)
+
+
+@instrumented
+def patch_story_in_db_with_fields(id: str, update_data: dict) -> Story:
+    update_data = validate_update(Story, update_data)
+    # A move to another epic is followed up by on_story_written, which points
+    # the story's tasks at the new epic
+    return patch_document("stories", Story, id, update_data)
+
+
+@instrumented
+def patch_epic_in_db_with_fields(id: str, update_data: dict) -> Epic:
+    update_data = validate_update(Epic, update_data)
+    return patch_document("epics", Epic, id, update_data)
+
+
+def patch_document(collection: str, model, id: str, update_data: dict):
+    # Read the document, then commit the update conditional on the version
+    # that was read, retrying if it changed in between. That is the same two
+    # round trips as update() followed by get(), but the response is merged
+    # locally from the exact version replaced, without a transaction
+    from google.api_core.exceptions import FailedPrecondition
+
+    db = get_client()
+    ref = db.collection(collection).document(id)
+    for _ in range(PATCH_MAX_ATTEMPTS):
+        snapshot = ref.get()
+        record(reads=1)
+        if not snapshot.exists:
+            raise DocumentNotFound(f"{model.__name__} {id} not found")
+        # Only update the fields provided in update_data, and only if the
+        # document is still the version that was read, so the merged response
+        # is exact
+        new = {**snapshot.to_dict(), **update_data}
+        batch = db.batch()
+        batch.update(
+            ref,
+            stamped(update_data),
+            option=db.write_option(last_update_time=snapshot.update_time),
+        )
+        if touches_index(update_data):
+            _, index_ref, entry = search_index_write(collection, id, new)
+            batch.set(index_ref, entry)
+        try:
+            batch.commit()
+        except FailedPrecondition:
+            continue
+        record(writes=len(batch))
+        return patched_item(collection, model, id, new)
+    raise RuntimeError(f"{model.__name__} {id} kept changing during the update")
+
+
+def patched_item(collection: str, model, id: str, new: dict):
+    # Build the updated item from the merged document instead of reading it
+    # back. validate_update only lets plain values through, so there are no
+    # server-side transforms to resolve
+    new = {field: value for field, value in new.items() if field != UPDATED_AT}
+    entity_cache.set(entity_key(collection, id), new)
+    return model.from_firestore(CachedDocument(id, new))
+
+
+def list_response(
+    req: https_fn.Request, collection: str, query_params: dict, model
+) -> https_fn.Response:
+    # Serialize a list query. Only the model's fields (or the subset requested
+    # with fields=) are fetched and documents are encoded straight to JSON
+    # without building models. limit/page_token page through the results in
+    # document id order, and format=ndjson streams one item per line instead of
+    # building the whole array in memory.
+    #
+    # Responses carry an ETag built from the query version, so a client polling
+    # with If-None-Match gets a 304 without the query being run. since=<token>
+    # returns only the documents updated after the token, oldest first, each
+    # with its updated_at; X-Change-Token is the token for the next poll or
+    # page and points after the last document returned
+    limit = page_limit(req, None, MAX_PAGE_SIZE)
+    page_token = req.args.get("page_token", None)
+    since, after_id = parse_change_token(req.args.get("since", None))
+    if since and page_token:
+        raise https_fn.HttpsError(
+            "invalid-argument", "since cannot be combined with page_token"
         )
-    if query_params.get("status"):
-        epics_ref = epics_ref.where("status", "==", query_params["status"])
-    if query_params.get("id"):
-        epics_ref = epics_ref.where("id", "==", query_params["id"])
 
-    return [Epic.from_firestore(doc) for doc in epics_ref.stream()]
+    etag = list_etag(req, query_version(collection, query_params))
+    if req.if_none_match.contains(etag):
+        response = https_fn.Response(status=304)
+        response.set_etag(etag)
+        return response
+
+    query = build_query(collection, query_params)
+    fields = requested_fields(req, model)
+    if since:
+        docs = stream_docs(
+            changes_query(query.select(fields + (UPDATED_AT,)), since, after_id, limit)
+        )
+    else:
+        docs = paginate_query(query.select(fields), limit, page_token).stream()
+
+    if req.args.get("format") == "ndjson":
+        # Streamed documents are read after the handler returns, so only the
+        # query itself is counted
+        if not since:
+            record(queries=1)
+        response = https_fn.Response(
+            stream_ndjson(docs, None if since else limit),
+            mimetype="application/x-ndjson",
+        )
+    else:
+        body, count, last_id = docs_to_json_array(docs)
+        if not since:
+            record(reads=max(count, 1), queries=1)
+        response = https_fn.Response(body, mimetype="application/json")
+        if limit and count == limit and not since:
+            response.headers["X-Next-Page-Token"] = last_id
+    response.set_etag(etag)
+    if since:
+        response.headers["X-Change-Token"] = (
+            change_token(docs[-1].to_dict()[UPDATED_AT], docs[-1].id)
+            if docs
+            else req.args["since"]
+        )
+    return response
 
 
-def patch_epic_in_db_with_fields(id: str, update_data: dict) -> Epic:
-    db = firestore.client()
-    epic_ref = db.collection("epics").document(id)
-    # Only update the fields provided in update_data
-    epic_ref.update(update_data)
-    epic = Epic.from_firestore(epic_ref.get())
-    return epic
+def page_limit(req: https_fn.Request, default: int | None, maximum: int):
+    # limit= of a paged endpoint. paginate_query drops a limit of 0, so only
+    # 1..maximum is accepted
+    try:
+        limit = int(req.args["limit"]) if req.args.get("limit") else default
+    except ValueError:
+        raise https_fn.HttpsError("invalid-argument", "limit must be an integer")
+    if limit is not None and not 0 < limit <= maximum:
+        raise https_fn.HttpsError(
+            "invalid-argument", f"limit must be between 1 and {maximum}"
+        )
+    return limit
+
+
+def list_etag(req: https_fn.Request, version: str) -> str:
+    # The same version serves different bodies for different parameters
+    # (fields, paging, format), so the query string is part of the tag
+    digest = hashlib.sha1(version.encode())
+    digest.update(req.query_string)
+    return digest.hexdigest()
+
+
+def change_token(updated_at: datetime, id: str) -> str:
+    return f"{updated_at.isoformat()},{id}"
+
+
+def parse_change_token(token: str | None) -> tuple[datetime | None, str | None]:
+    # Change tokens are "<updated_at>,<id>" of the last document sent. A plain
+    # ISO 8601 timestamp starts from that time
+    if not token:
+        return None, None
+    timestamp, _, after_id = token.partition(",")
+    try:
+        since = datetime.fromisoformat(timestamp)
+    except ValueError:
+        raise https_fn.HttpsError("invalid-argument", "since must be a change token")
+    since = since if since.tzinfo else since.replace(tzinfo=timezone.utc)
+    return since, after_id or None
+
+
+def stream_docs(query) -> list:
+    # Run a query, counting its reads. A query is billed at least one read
+    # even when it matches nothing
+    docs = list(query.stream())
+    record(reads=max(len(docs), 1), queries=1)
+    return docs
+
+
+def requested_fields(req: https_fn.Request, model) -> tuple:
+    # fields=id,name,status projects the response onto those fields. Defaults
+    # to every field of the model
+    fields = req.args.get("fields", None)
+    if not fields:
+        return model.__slots__
+    fields = tuple(dict.fromkeys(f.strip() for f in fields.split(",") if f.strip()))
+    unknown = [field for field in fields if field not in model.__slots__]
+    if unknown or not fields:
+        raise https_fn.HttpsError(
+            "invalid-argument", f"Unknown fields: {', '.join(unknown)}"
+        )
+    return fields
+
+
+def stream_ndjson(docs, limit: int = None):
+    # Yield each document as a JSON line. A full page ends with a
+    # {"next_page_token": ...} line for fetching the next one
+    count = 0
+    last_id = None
+    for doc in docs:
+        count += 1
+        last_id = doc.id
+        yield doc_to_json(doc) + b"\n"
+    if limit and count == limit:
+        yield dumps({"next_page_token": last_id}) + b"\n"
 
 
 # ========== DAILY SCHEDULE ==========
 @https_fn.on_request()
+@instrumented
 def get_schedule(req: https_fn.Request) -> https_fn.Response:
     """A function that gets a user's daily schedule"""
     user_id = req.args.get("user_id")
@@ -393,13 +1439,15 @@ def get_schedule(req: https_fn.Request) -> https_fn.Response:
         return https_fn.Response("Missing user_id", status=400)
 
     # Fetch the user's schedule from the database
-    schedule = get_user_schedule(user_id)
-    return https_fn.Response(schedule)
+    return get_user_schedule(user_id)
 
 
 @https_fn.on_request()
+@instrumented
 def update_schedule(req: https_fn.Request) -> https_fn.Response:
-    """A function that updates a user's daily schedule"""
+    """A function that updates a user's daily schedule. The schedule data may
+    hold "pinned" (task ids to put first in today's plan) and "rebuild" (true
+    to recompute the schedule from the user's tasks)"""
     if req.method != "POST":
         return https_fn.Response("Invalid request method", status=400)
 
@@ -410,22 +1458,119 @@ def update_schedule(req: https_fn.Request) -> https_fn.Response:
     schedule_data = json.loads(req.data).get("schedule")
     if not schedule_data:
         return https_fn.Response("Missing schedule data", status=400)
+    if not isinstance(schedule_data, dict):
+        return https_fn.Response("Schedule data must be an object", status=400)
 
     try:
         update_user_schedule(user_id, schedule_data)
         return https_fn.Response("Schedule updated successfully", status=200)
+    except ValueError as e:
+        return https_fn.Response(f"Invalid schedule: {e}", status=400)
     except Exception as e:
         return https_fn.Response(f"Error updating schedule: {e}", status=500)
 
 
 # ========= HELPERS FOR SCHEDULE ==========
 def get_user_schedule(user_id: str) -> dict:
-    # Placeholder function to fetch user schedule from the database
-    # Replace with actual database fetching logic
-    return {"user_id": user_id, "schedule": "Sample Schedule"}
+    # Read the materialized schedule, building it on first use
+    doc = get_client().collection("schedules").document(user_id).get()
+    record(reads=1)
+    schedule = doc.to_dict() if doc.exists else rebuild_user_schedule(user_id)
+    return {
+        "user_id": user_id,
+        **day_plan(schedule["items"], schedule.get("pinned")),
+    }
 
 
 def update_user_schedule(user_id: str, schedule_data: dict) -> None:
-    # Placeholder function to update user schedule in the database
-    # Replace with actual database updating logic
-    pass
+    pinned = schedule_data.get("pinned", [])
+    if not isinstance(pinned, list) or not all(isinstance(id, str) for id in pinned):
+        raise ValueError("pinned must be a list of task ids")
+    schedule_ref = get_client().collection("schedules").document(user_id)
+    if schedule_data.get("rebuild"):
+        rebuild_user_schedule(user_id, pinned)
+        return
+    exists = schedule_ref.get(["pinned"]).exists
+    record(reads=1)
+    if not exists:
+        rebuild_user_schedule(user_id, pinned)
+    else:
+        schedule_ref.update({"pinned": pinned})
+        record(writes=1)
+
+
+def rebuild_user_schedule(user_id: str, pinned: list = None) -> dict:
+    # One indexed query for the user's open tasks, ordered with a heap
+    query = (
+        get_client()
+        .collection("tasks")
+        .where("assigned_user_id", "==", user_id)
+        .where("status", "in", list(OPEN_STATUSES))
+        .select(list(ENTRY_FIELDS) + ["assigned_user_id"])
+    )
+    items, truncated = build_items(
+        entry_from_task({**doc.to_dict(), "id": doc.id}, user_id)
+        for doc in stream_docs(query)
+    )
+    schedule = {
+        "user_id": user_id,
+        "items": items,
+        "truncated": truncated,
+        "pinned": pinned or [],
+        "updated_at": datetime.now(timezone.utc).isoformat(),
+    }
+    get_client().collection("schedules").document(user_id).set(schedule)
+    record(writes=1)
+    return schedule
+
+
+def refresh_schedules(changes: list) -> None:
+    # Apply (old task, new task) changes to the materialized schedules of the
+    # users the tasks were or are assigned to. Schedules that were never built
+    # are left alone. Applying a change twice is harmless, so a failure is
+    # raised for the trigger to be retried
+    by_user = defaultdict(list)
+    for old, new in changes:
+        task_id = (new or old)["id"]
+        for task in (old, new):
+            user_id = (task or {}).get("assigned_user_id")
+            if user_id:
+                by_user[user_id].append((task_id, entry_from_task(new, user_id)))
+    for user_id, user_changes in by_user.items():
+        apply_schedule_changes(user_id, user_changes)
+
+
+def apply_schedule_changes(user_id: str, changes: list) -> None:
+    from google.cloud.firestore import transactional
+
+    db = get_client()
+    schedule_ref = db.collection("schedules").document(user_id)
+
+    @transactional
+    def apply(transaction) -> bool:
+        snapshot = schedule_ref.get(transaction=transaction)
+        if not snapshot.exists:
+            return False
+        schedule = snapshot.to_dict()
+        items = schedule["items"]
+        for task_id, entry in changes:
+            items = apply_change(items, task_id, entry)
+        # A truncated schedule that shrinks may be missing tasks that were
+        # dropped when it was built
+        if schedule.get("truncated") and len(items) < MAX_ITEMS:
+            return True
+        transaction.update(
+            schedule_ref,
+            {"items": items, "updated_at": datetime.now(timezone.utc).isoformat()},
+        )
+        return False
+
+    rebuild = apply(db.transaction())
+    record(reads=1, writes=0 if rebuild else 1)
+    if rebuild:
+        pinned = schedule_ref.get(["pinned"]).to_dict().get("pinned")
+        record(reads=1)
+        rebuild_user_schedule(user_id, pinned)
+
+
+record_import_time(_IMPORT_STARTED)
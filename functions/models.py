@@ -1,13 +1,104 @@
-from firebase_admin import initialize_app, auth, firestore
-from firebase_admin.firestore import Client
 import uuid
 from datetime import datetime, timezone
+from typing import TYPE_CHECKING
 
-STATUSES = ["Pending", "In Progress", "Completed"]
+if TYPE_CHECKING:
+    from google.cloud.firestore import Client
+
+STATUSES = frozenset({"Pending", "In Progress", "Completed"})
+
+
+def _from_trusted(cls, id: str, data: dict):
+    # Build a model from a document that was validated when it was written,
+    # skipping __init__ and its status/due_date checks
+    item = object.__new__(cls)
+    item.id = id
+    for field in cls.__slots__[1:]:
+        setattr(item, field, data.get(field))
+    return item
+
+
+def _check_status(status: str) -> None:
+    if not isinstance(status, str) or status not in STATUSES:
+        raise ValueError(f"Invalid status: {status}. Must be one of {sorted(STATUSES)}")
+
+
+def _check_due_date(due_date: str) -> None:
+    try:
+        datetime.fromisoformat(due_date)
+    except (TypeError, ValueError):
+        raise ValueError(
+            f"Invalid due_date format: {due_date}. Must be ISO 8601 format (YYYY-MM-DDTHH:MM:SS+00:00)"
+        )
+
+
+def _check_strings(data: dict) -> None:
+    for field in STRING_FIELDS.intersection(data):
+        value = data[field]
+        if not isinstance(value, str) and not (
+            value is None and field in OPTIONAL_FIELDS
+        ):
+            raise ValueError(f"Invalid {field}: {value!r}. Must be a string")
+        if value and field in KEY_FIELDS:
+            check_document_id(value, field)
+
+
+def check_document_id(id: str, field: str = "id") -> None:
+    # Firestore document ids cannot contain "/", be "." or "..", or look like
+    # the reserved __name__ ids
+    if "/" in id or id in (".", "..") or (id.startswith("__") and id.endswith("__")):
+        raise ValueError(f"Invalid {field}: {id!r}. Not a valid document id")
+
+
+# Fields that are set once when an item is created
+READ_ONLY_FIELDS = frozenset({"id", "created_at"})
+# Fields that hold a string, and those of them that may also be None
+STRING_FIELDS = frozenset(
+    {"id", "name", "description", "creator_id", "assigned_user_id"}
+    | {"epic_id", "story_id"}
+)
+OPTIONAL_FIELDS = frozenset({"id", "assigned_user_id", "epic_id", "story_id"})
+# Fields that hold a document id
+KEY_FIELDS = frozenset({"id", "epic_id", "story_id"})
+
+
+def validate_update(cls, update_data: dict) -> dict:
+    # Check a partial update against the model without reading the document:
+    # only known, writable fields, with the same status and due_date rules as
+    # the model's __init__ and strings where strings are expected. Returns the
+    # update unchanged
+    if not isinstance(update_data, dict) or not update_data:
+        raise ValueError("No data provided for update")
+    invalid = [
+        field
+        for field in update_data
+        if field not in cls.__slots__ or field in READ_ONLY_FIELDS
+    ]
+    if invalid:
+        raise ValueError(f"Fields cannot be updated: {', '.join(invalid)}")
+    if "status" in update_data:
+        _check_status(update_data["status"])
+    if "due_date" in update_data and update_data["due_date"] != cls.NO_DUE_DATE:
+        _check_due_date(update_data["due_date"])
+    _check_strings(update_data)
+    return update_data
 
 
 # model class for epic
 class Epic:
+    __slots__ = (
+        "id",
+        "name",
+        "description",
+        "creator_id",
+        "assigned_user_id",
+        "status",
+        "due_date",
+        "created_at",
+    )
+    # due_date of an epic without one
+    NO_DUE_DATE = ""
+
     def __init__(
         self,
         id: str,
@@ -15,30 +106,20 @@ class Epic:
         description: str,
         creator_id: str,
         status: str,
-        child_user_stories: list = [],
         assigned_user_id: str = None,
         due_date: str = "",  # format: "YYYY-MM-DDTHH:MM:SS+00:00" (ISO 8601 with timezone)
         created_at: str = None,
     ):
-        if status not in STATUSES:
-            raise ValueError(f"Invalid status: {status}. Must be one of {STATUSES}")
+        _check_status(status)
         self.id = id
         self.name = name
         self.description = description
         self.creator_id = creator_id
         self.assigned_user_id = assigned_user_id
-        self.child_user_stories = child_user_stories
         self.status = status
-        if due_date != "":
-            try:
-                datetime.fromisoformat(due_date)
-                self.due_date = due_date
-            except ValueError:
-                raise ValueError(
-                    f"Invalid due_date format: {due_date}. Must be ISO 8601 format (YYYY-MM-DDTHH:MM:SS+00:00)"
-                )
-        else:
-            self.due_date = ""
+        if due_date != Epic.NO_DUE_DATE:
+            _check_due_date(due_date)
+        self.due_date = due_date
         self.created_at = (
             created_at or datetime.now(timezone.utc).replace(microsecond=0).isoformat()
         )
@@ -49,7 +130,6 @@ class Epic:
             "name": self.name,
             "description": self.description,
             "creator_id": self.creator_id,
-            "child_user_stories": self.child_user_stories,
             "assigned_user_id": self.assigned_user_id,
             "status": self.status,
             "due_date": self.due_date,
@@ -58,6 +138,7 @@ class Epic:
 
     @staticmethod
     def from_dict(data: dict, id: str = None):
+        _check_strings({**data, "id": id})
         try:
             return Epic(
                 id=id or uuid.uuid4().hex,
@@ -66,15 +147,16 @@ class Epic:
                 creator_id=data["creator_id"],
                 status=data["status"],
                 assigned_user_id=data["assigned_user_id"],
-                child_user_stories=data["child_user_stories"],
                 due_date=data["due_date"],
             )
         except KeyError as e:
             raise ValueError(f"Missing required field: {e}")
 
     @staticmethod
-    def from_firestore(doc) -> "Epic":
+    def from_firestore(doc, trusted: bool = True) -> "Epic":
         data = doc.to_dict()
+        if trusted:
+            return _from_trusted(Epic, doc.id, data)
         return Epic(
             id=doc.id,
             name=data["name"],
@@ -82,19 +164,32 @@ class Epic:
             creator_id=data["creator_id"],
             status=data["status"],
             assigned_user_id=data["assigned_user_id"],
-            child_user_stories=data["child_user_stories"],
             due_date=data["due_date"],
             created_at=data["created_at"],
         )
 
     @staticmethod
-    def to_firestore(epic: "Epic", db: Client) -> dict:
+    def to_firestore(epic: "Epic", db: "Client") -> dict:
         epic_ref = db.collection("epics").document(epic.id)
         epic_ref.set(epic.to_dict())
         return epic_ref
 
 
 class Story:
+    __slots__ = (
+        "id",
+        "name",
+        "description",
+        "status",
+        "epic_id",
+        "creator_id",
+        "assigned_user_id",
+        "due_date",
+        "created_at",
+    )
+    # due_date of an item without one
+    NO_DUE_DATE = None
+
     def __init__(
         self,
         id: str,
@@ -102,32 +197,22 @@ class Story:
         description: str,
         status: str,
         creator_id: str,
-        child_tasks: list = [],
         assigned_user_id: str = None,
         epic_id: str = None,
         due_date: str = None,
         created_at: str = None,
     ):
-        if status not in STATUSES:
-            raise ValueError(f"Invalid status: {status}. Must be one of {STATUSES}")
+        _check_status(status)
         self.id = id
         self.name = name
         self.description = description
         self.status = status
         self.epic_id = epic_id
-        self.child_tasks = child_tasks
         self.creator_id = creator_id
         self.assigned_user_id = assigned_user_id
         if due_date is not None:
-            try:
-                datetime.fromisoformat(due_date)
-                self.due_date = due_date
-            except ValueError:
-                raise ValueError(
-                    f"Invalid due_date format: {due_date}. Must be ISO 8601 format (YYYY-MM-DDTHH:MM:SS+00:00)"
-                )
-        else:
-            self.due_date = None
+            _check_due_date(due_date)
+        self.due_date = due_date
         self.created_at = (
             created_at or datetime.now(timezone.utc).replace(microsecond=0).isoformat()
         )
@@ -139,7 +224,6 @@ class Story:
             "description": self.description,
             "status": self.status,
             "epic_id": self.epic_id,
-            "child_tasks": self.child_tasks,
             "creator_id": self.creator_id,
             "assigned_user_id": self.assigned_user_id,
             "due_date": self.due_date,
@@ -148,6 +232,7 @@ class Story:
 
     @staticmethod
     def from_dict(data: dict, id: str = None):
+        _check_strings({**data, "id": id})
         try:
             return Story(
                 id=id or uuid.uuid4().hex,
@@ -155,7 +240,6 @@ class Story:
                 description=data["description"],
                 status=data["status"],
                 epic_id=data["epic_id"],
-                child_tasks=data["child_tasks"],
                 creator_id=data["creator_id"],
                 assigned_user_id=data["assigned_user_id"],
                 due_date=data["due_date"],
@@ -164,15 +248,16 @@ class Story:
             raise ValueError(f"Missing required field: {e}")
 
     @staticmethod
-    def from_firestore(doc) -> "Story":
+    def from_firestore(doc, trusted: bool = True) -> "Story":
         data = doc.to_dict()
+        if trusted:
+            return _from_trusted(Story, doc.id, data)
         return Story(
             id=doc.id,
             name=data["name"],
             description=data["description"],
             status=data["status"],
             epic_id=data["epic_id"],
-            child_tasks=data["child_tasks"],
             creator_id=data["creator_id"],
             assigned_user_id=data["assigned_user_id"],
             due_date=data["due_date"],
@@ -180,13 +265,28 @@ class Story:
         )
 
     @staticmethod
-    def to_firestore(story: "Story", db: Client) -> dict:
+    def to_firestore(story: "Story", db: "Client") -> dict:
         story_ref = db.collection("stories").document(story.id)
         story_ref.set(story.to_dict())
         return story_ref
 
 
 class Task:
+    __slots__ = (
+        "id",
+        "name",
+        "description",
+        "status",
+        "story_id",
+        "epic_id",
+        "creator_id",
+        "assigned_user_id",
+        "due_date",
+        "created_at",
+    )
+    # due_date of an item without one
+    NO_DUE_DATE = None
+
     def __init__(
         self,
         id: str,
@@ -198,26 +298,21 @@ class Task:
         story_id: str = None,
         due_date: str = None,
         created_at: str = None,
+        epic_id: str = None,
     ):
-        if status not in STATUSES:
-            raise ValueError(f"Invalid status: {status}. Must be one of {STATUSES}")
+        _check_status(status)
         self.id = id
         self.creator_id = creator_id
         self.name = name
         self.description = description
         self.status = status
         self.story_id = story_id
+        # Denormalized from the story so tasks can be queried by epic
+        self.epic_id = epic_id
         self.assigned_user_id = assigned_user_id
         if due_date is not None:
-            try:
-                datetime.fromisoformat(due_date)
-                self.due_date = due_date
-            except ValueError:
-                raise ValueError(
-                    f"Invalid due_date format: {due_date}. Must be ISO 8601 format (YYYY-MM-DDTHH:MM:SS+00:00)"
-                )
-        else:
-            self.due_date = None
+            _check_due_date(due_date)
+        self.due_date = due_date
         self.created_at = (
             created_at or datetime.now(timezone.utc).replace(microsecond=0).isoformat()
         )
@@ -229,6 +324,7 @@ class Task:
             "description": self.description,
             "status": self.status,
             "story_id": self.story_id,
+            "epic_id": self.epic_id,
             "creator_id": self.creator_id,
             "assigned_user_id": self.assigned_user_id,
             "due_date": self.due_date,
@@ -237,6 +333,7 @@ class Task:
 
     @staticmethod
     def from_dict(data: dict, id: str = None):
+        _check_strings({**data, "id": id})
         try:
             task = Task(
                 id=id or uuid.uuid4().hex,
@@ -253,8 +350,10 @@ class Task:
             raise ValueError(f"Missing required field: {e}")
 
     @staticmethod
-    def from_firestore(doc) -> "Task":
+    def from_firestore(doc, trusted: bool = True) -> "Task":
         data = doc.to_dict()
+        if trusted:
+            return _from_trusted(Task, doc.id, data)
         return Task(
             id=doc.id,
             name=data["name"],
@@ -265,10 +364,11 @@ class Task:
             assigned_user_id=data["assigned_user_id"],
             due_date=data["due_date"],
             created_at=data["created_at"],
+            epic_id=data.get("epic_id"),
         )
 
     @staticmethod
-    def to_firestore(task: "Task", db: Client) -> dict:
+    def to_firestore(task: "Task", db: "Client") -> dict:
         task_ref = db.collection("tasks").document(task.id)
         task_ref.set(task.to_dict())
         return task_ref
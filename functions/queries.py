@@ -0,0 +1,83 @@
+# Query builders for the list endpoints.
+#
+# QUERY_FILTERS is the single source of truth for the equality filters each
+# collection can be queried by. tools/generate_indexes.py derives the composite
+# indexes in firestore.indexes.json from it, so a filter added here without a
+# matching index fails the index check.
+#
+# Every write stamps updated_at (see db.stamped), which gives each query a cheap
+# version: the number of matching documents plus the newest updated_at among
+# them. Any add, change or removal in the result set changes one of the two,
+# so the version serves as the ETag of a list response without running the
+# query itself, and since= returns just the documents changed after a token.
+
+import async_db
+from db import DOCUMENT_ID, UPDATED_AT, get_client
+from instrumentation import record
+
+# Equality filters each list query supports, in the order they are applied
+QUERY_FILTERS = {
+    "epics": ("creator_id", "assigned_user_id", "status"),
+    "stories": ("creator_id", "assigned_user_id", "epic_id", "status"),
+    "tasks": ("creator_id", "assigned_user_id", "epic_id", "story_id", "status"),
+}
+
+
+def build_query(collection: str, query_params: dict, client=None):
+    # Build the query for the given equality filters; empty values are ignored.
+    # client defaults to the sync client; pass the async one to run it there
+    query = (client or get_client()).collection(collection)
+    for field in QUERY_FILTERS[collection]:
+        if query_params.get(field):
+            query = query.where(field, "==", query_params[field])
+    return query
+
+
+def paginate_query(query, limit: int = None, page_token: str = None):
+    # Order by document id so that pages are stable, and resume after the last
+    # id of the previous page
+    if limit is None and not page_token:
+        return query
+    query = query.order_by(DOCUMENT_ID)
+    if page_token:
+        query = query.start_after({DOCUMENT_ID: page_token})
+    if limit:
+        query = query.limit(limit)
+    return query
+
+
+def changes_query(query, since, after_id: str = None, limit: int = None):
+    # Documents updated after the change token (since, after_id), oldest first
+    # and in document id order within a timestamp, so that a client paging
+    # with limit resumes right after the last document it was sent. Writes of
+    # one batch share their updated_at, hence the id in the token
+    query = query.order_by(UPDATED_AT).order_by(DOCUMENT_ID)
+    if after_id:
+        query = query.start_after({UPDATED_AT: since, DOCUMENT_ID: after_id})
+    else:
+        query = query.where(UPDATED_AT, ">", since)
+    return query.limit(limit) if limit else query
+
+
+def query_version(collection: str, query_params: dict) -> str:
+    # Count aggregation plus a one-document read of the newest updated_at, run
+    # concurrently. Documents written before updated_at existed only show up in
+    # the count
+    query = build_query(collection, query_params, async_db.get_async_client())
+    counts, latest = async_db.run(
+        async_db.gather_bounded(
+            [
+                query.count().get(),
+                async_db.stream(
+                    query.order_by(UPDATED_AT, direction="DESCENDING")
+                    .limit(1)
+                    .select([UPDATED_AT])
+                ),
+            ]
+        )
+    )
+    count = counts[0][0].value
+    # Aggregations are billed one read per 1000 index entries scanned
+    record(reads=max(-(-count // 1000), 1), queries=1)
+    updated_at = latest[0].to_dict().get(UPDATED_AT) if latest else None
+    return f"{count}:{updated_at.isoformat() if updated_at else ''}"
@@ -0,0 +1,143 @@
+# Repositories for epics, stories and tasks.
+#
+# EpicRepo, StoryRepo and TaskRepo are what the data-access helpers in main.py
+# go through for point reads and batched reads. Storage is delegated to a
+# backend shared by all three:
+#
+# - FirestoreBackend: the entity cache in front of point reads and one get_all
+#   for batched reads. Reads are reported to the instrumentation.
+# - MemoryBackend: documents in dicts, for tests of code that only reads.
+#
+# Repositories use Firestore unless use_backend() swaps the backend, as the
+# tests do. Writes, list queries and triggers use Firestore batches, bulk
+# writers, transactions and cursors directly, so only reads are pluggable.
+# Tests of those paths run against an in-memory Firestore client instead.
+
+import threading
+from collections import defaultdict
+
+from cache import MISSING, CachedDocument, entity_cache, entity_key
+from db import get_client
+from instrumentation import record
+
+_lock = threading.Lock()
+_backend = None
+_repos = {}
+
+
+class FirestoreBackend:
+    """Backend on the shared Firestore client and entity cache"""
+
+    def get(self, collection: str, id: str, field_paths: list = None, use_cache=True):
+        # Point read on the document key, served from the entity cache when
+        # possible. Returns None when the document is missing
+        key = entity_key(collection, id)
+        data = entity_cache.get(key) if use_cache else MISSING
+        if data is MISSING:
+            doc = get_client().collection(collection).document(id).get()
+            record(reads=1)
+            if not doc.exists:
+                return None
+            data = doc.to_dict()
+            entity_cache.set(key, data)
+        return CachedDocument(id, data, field_paths)
+
+    def get_many(self, collection: str, ids: list, use_cache: bool = True) -> list:
+        # Cached documents come from the entity cache and the rest from a
+        # single get_all call. Missing documents are skipped and the result
+        # keeps the order of the given ids
+        ids = list(dict.fromkeys(id for id in ids if id))
+        found = {}
+        misses = []
+        for id in ids:
+            data = (
+                entity_cache.get(entity_key(collection, id)) if use_cache else MISSING
+            )
+            if data is MISSING:
+                misses.append(id)
+            else:
+                found[id] = data
+        if misses:
+            db = get_client()
+            refs = [db.collection(collection).document(id) for id in misses]
+            record(reads=len(refs))
+            for doc in db.get_all(refs):
+                if doc.exists:
+                    found[doc.id] = doc.to_dict()
+                    entity_cache.set(entity_key(collection, doc.id), found[doc.id])
+        return [CachedDocument(id, found[id]) for id in ids if id in found]
+
+
+class MemoryBackend:
+    """Process-local backend keeping each collection's documents by id"""
+
+    def __init__(self):
+        self._docs = defaultdict(dict)
+
+    def get(self, collection: str, id: str, field_paths: list = None, use_cache=True):
+        data = self._docs[collection].get(id)
+        if data is None:
+            return None
+        return CachedDocument(id, dict(data), field_paths)
+
+    def get_many(self, collection: str, ids: list, use_cache: bool = True) -> list:
+        docs = self._docs[collection]
+        return [
+            CachedDocument(id, dict(docs[id]))
+            for id in dict.fromkeys(ids)
+            if id in docs
+        ]
+
+    def set(self, collection: str, id: str, data: dict) -> None:
+        self._docs[collection][id] = dict(data)
+
+
+class Repo:
+    """Reads of one collection through the current backend"""
+
+    collection = None
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def get(self, id: str, field_paths: list = None, use_cache: bool = True):
+        """Document snapshot (id, exists, to_dict()) or None"""
+        return self.backend.get(self.collection, id, field_paths, use_cache)
+
+    def get_many(self, ids: list, use_cache: bool = True) -> list:
+        return self.backend.get_many(self.collection, ids, use_cache)
+
+
+class EpicRepo(Repo):
+    collection = "epics"
+
+
+class StoryRepo(Repo):
+    collection = "stories"
+
+
+class TaskRepo(Repo):
+    collection = "tasks"
+
+
+REPOS = {repo.collection: repo for repo in (EpicRepo, StoryRepo, TaskRepo)}
+
+
+def use_backend(backend) -> None:
+    """Route every repository through backend from now on"""
+    global _backend
+    with _lock:
+        _backend = backend
+        _repos.clear()
+
+
+def get_repo(collection: str) -> Repo:
+    """Return the repository of epics, stories or tasks"""
+    global _backend
+    repo = _repos.get(collection)
+    if repo is None:
+        with _lock:
+            if _backend is None:
+                _backend = FirestoreBackend()
+            repo = _repos.setdefault(collection, REPOS[collection](_backend))
+    return repo
@@ -0,0 +1,103 @@
+# Per-story and per-epic progress rollups.
+#
+# Stories and epics keep a "progress" map counting their tasks by status, plus
+# the open (not Completed) tasks by UTC due day:
+#
+#   {"total": 11, "Pending": 3, "In Progress": 1, "Completed": 7,
+#    "open_due": {"2026-10-16": 2, "2026-10-20": 2}}
+#
+# The on_task_written trigger turns every task write into Increment deltas on
+# the task's story and epic (see task_deltas), so the map stays current without
+# reading any tasks. A story moved to another epic needs no delta of its own:
+# its tasks follow it, and each task's write moves its own contribution.
+# Overdue counts are derived at read time from the open_due buckets.
+
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+
+from models import STATUSES
+
+COMPLETED = "Completed"
+
+
+def due_day(due_date: str) -> str | None:
+    if not due_date:
+        return None
+    try:
+        due = datetime.fromisoformat(due_date)
+    except ValueError:
+        return None
+    if due.tzinfo is None:
+        due = due.replace(tzinfo=timezone.utc)
+    return due.astimezone(timezone.utc).date().isoformat()
+
+
+def task_contributions(task: dict | None) -> Counter:
+    # Progress field paths (as tuples) a task counts towards
+    counts = Counter()
+    if not task:
+        return counts
+    counts[("total",)] += 1
+    counts[(task["status"],)] += 1
+    day = due_day(task.get("due_date"))
+    if task["status"] != COMPLETED and day:
+        counts[("open_due", day)] += 1
+    return counts
+
+
+def task_deltas(old: dict | None, new: dict | None, deltas: dict = None) -> dict:
+    # Accumulate the progress changes of a task going from old to new (either
+    # may be None) into {(collection, id): Counter(field path -> delta)}
+    deltas = deltas if deltas is not None else defaultdict(Counter)
+    for task, sign in ((old, -1), (new, 1)):
+        if not task:
+            continue
+        contributions = task_contributions(task)
+        for collection, parent_id in (
+            ("stories", task.get("story_id")),
+            ("epics", task.get("epic_id")),
+        ):
+            if parent_id:
+                for path, count in contributions.items():
+                    deltas[(collection, parent_id)][path] += sign * count
+    return deltas
+
+
+def nonzero(deltas: dict) -> dict:
+    result = {}
+    for key, counts in deltas.items():
+        counts = {path: count for path, count in counts.items() if count}
+        if counts:
+            result[key] = counts
+    return result
+
+
+def build_progress(tasks) -> dict:
+    # Rollup computed from scratch, used by the repair job
+    progress = {"total": 0, "open_due": {}}
+    progress.update({status: 0 for status in STATUSES})
+    for task in tasks:
+        for path, count in task_contributions(task).items():
+            if path[0] == "open_due":
+                progress["open_due"][path[1]] = (
+                    progress["open_due"].get(path[1], 0) + count
+                )
+            else:
+                progress[path[0]] = progress.get(path[0], 0) + count
+    return progress
+
+
+def summarize(progress: dict, now: datetime = None) -> dict:
+    # Client-facing view of a progress map. Tasks due before today (UTC) and
+    # not completed count as overdue
+    progress = progress or {}
+    today = (now or datetime.now(timezone.utc)).date().isoformat()
+    return {
+        "total": progress.get("total", 0),
+        "counts": {status: progress.get(status, 0) for status in sorted(STATUSES)},
+        "overdue": sum(
+            count
+            for day, count in (progress.get("open_due") or {}).items()
+            if day < today
+        ),
+    }
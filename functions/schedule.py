@@ -0,0 +1,103 @@
+# Daily schedule engine.
+#
+# A user's schedule is materialized in schedules/{user_id} as the list of their
+# open tasks in priority order: earliest due date first (tasks without one
+# last), In Progress before Pending, then oldest first. It is built once with a
+# heap from a single query and then kept current by apply_change() whenever a
+# task assigned to the user is written. The day plan (overdue / today /
+# upcoming) is cut from the ordered list at read time.
+
+import heapq
+from bisect import insort
+from datetime import datetime, timezone
+
+# Open statuses, in the order they are worked on
+OPEN_STATUSES = ("In Progress", "Pending")
+STATUS_RANK = {status: rank for rank, status in enumerate(OPEN_STATUSES)}
+# Task fields copied into schedule entries
+ENTRY_FIELDS = ("name", "status", "due_date", "story_id", "epic_id", "created_at")
+# Most entries kept in one schedule document
+MAX_ITEMS = 500
+# Upcoming tasks shown after today's
+UPCOMING_ITEMS = 10
+
+
+def due_utc(due_date: str) -> str | None:
+    if not due_date:
+        return None
+    try:
+        due = datetime.fromisoformat(due_date)
+    except ValueError:
+        return None
+    if due.tzinfo is None:
+        due = due.replace(tzinfo=timezone.utc)
+    return due.astimezone(timezone.utc).isoformat()
+
+
+def entry_from_task(task: dict | None, user_id: str) -> dict | None:
+    # Schedule entry for a task, or None when it does not belong on the user's
+    # schedule
+    if (
+        not task
+        or task.get("assigned_user_id") != user_id
+        or task.get("status") not in STATUS_RANK
+    ):
+        return None
+    entry = {field: task.get(field) for field in ENTRY_FIELDS}
+    entry["id"] = task["id"]
+    entry["due_utc"] = due_utc(task.get("due_date"))
+    return entry
+
+
+def priority(entry: dict) -> tuple:
+    return (
+        entry["due_utc"] is None,
+        entry["due_utc"] or "",
+        STATUS_RANK[entry["status"]],
+        entry.get("created_at") or "",
+        entry["id"],
+    )
+
+
+def build_items(entries) -> tuple[list, bool]:
+    # Order entries with a heap, keeping the first MAX_ITEMS. Returns the items
+    # and whether any were dropped
+    heap = [(priority(entry), entry) for entry in entries]
+    heapq.heapify(heap)
+    items = [heapq.heappop(heap)[1] for _ in range(min(len(heap), MAX_ITEMS))]
+    return items, bool(heap)
+
+
+def apply_change(items: list, task_id: str, entry: dict | None) -> list:
+    # Remove the task's old entry and insert its new one in priority order
+    items = [item for item in items if item["id"] != task_id]
+    if entry:
+        insort(items, entry, key=priority)
+    return items[:MAX_ITEMS]
+
+
+def day_plan(items: list, pinned: list = (), now: datetime = None) -> dict:
+    # Cut the ordered items into overdue, today and upcoming. Pinned tasks go
+    # to the front of today's plan
+    now = (now or datetime.now(timezone.utc)).astimezone(timezone.utc)
+    today = now.date().isoformat()
+    now = now.isoformat()
+    pinned = list(pinned or ())
+    overdue, due_today, upcoming = [], [], []
+    for item in items:
+        due = item["due_utc"]
+        if item["id"] in pinned:
+            continue
+        if due and due < now:
+            overdue.append(item)
+        elif due and due[:10] == today:
+            due_today.append(item)
+        elif len(upcoming) < UPCOMING_ITEMS:
+            upcoming.append(item)
+    by_id = {item["id"]: item for item in items}
+    return {
+        "date": today,
+        "overdue": overdue,
+        "today": [by_id[id] for id in pinned if id in by_id] + due_today,
+        "upcoming": upcoming,
+    }
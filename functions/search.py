@@ -0,0 +1,121 @@
+# Full-text and prefix search over item names and descriptions.
+#
+# Every epic, story and task has an entry in search_{collection}/{id}:
+#
+#   {"name": "Fix login bug", "tokens": ["fix", "login", "bug", ...],
+#    "prefixes": ["fi", "fix", "lo", "log", ...], "weights": {"fix": 3, ...}}
+#
+# Firestore's automatic index on the tokens and prefixes arrays acts as the
+# posting list of each term, so a term lookup is a single array_contains query
+# and index updates never contend on a shared per-term document. The entry is
+# written alongside the item on upload and whenever its name or description
+# changes. Candidates are ranked locally from the weights map.
+
+import re
+import unicodedata
+
+# Collection of the search entries of a collection's items
+INDEX_COLLECTION = "search_{}"
+# Fields that are indexed, and the weight of a term found in each
+FIELD_WEIGHTS = {"name": 3, "description": 1}
+# Prefixes shorter than this are not indexed, so queries need two characters
+MIN_PREFIX = 2
+MAX_PREFIX = 15
+# Distinct tokens indexed per item, keeping entries far from document limits
+MAX_TOKENS = 200
+
+_WORD = re.compile(r"\w+")
+
+
+def index_collection(collection: str) -> str:
+    return INDEX_COLLECTION.format(collection)
+
+
+def tokenize(text: str) -> list:
+    # Lowercased words with accents removed, in order of appearance
+    if not text:
+        return []
+    text = unicodedata.normalize("NFKD", str(text).lower())
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return _WORD.findall(text)
+
+
+def index_entry(item: dict) -> dict:
+    weights = {}
+    for field, weight in FIELD_WEIGHTS.items():
+        for token in tokenize(item.get(field)):
+            if token in weights or len(weights) < MAX_TOKENS:
+                weights[token] = weights.get(token, 0) + weight
+    prefixes = {
+        token[:length]
+        for token in weights
+        for length in range(MIN_PREFIX, min(len(token), MAX_PREFIX) + 1)
+    }
+    return {
+        "name": item.get("name"),
+        "tokens": sorted(weights),
+        "prefixes": sorted(prefixes),
+        "weights": weights,
+    }
+
+
+def touches_index(update_data: dict) -> bool:
+    return any(field in update_data for field in FIELD_WEIGHTS)
+
+
+def parse_query(query: str) -> tuple[list, str | None]:
+    # Complete words, plus the last word as a prefix when the query does not
+    # end with a space (the user is still typing it)
+    terms = tokenize(query)
+    if terms and query and not query[-1].isspace():
+        return terms[:-1], terms[-1]
+    return terms, None
+
+
+def lookup_term(terms: list, prefix: str | None) -> tuple[str, str]:
+    # The most selective single lookup: the longest complete word, otherwise
+    # the prefix. Returns (array field, value)
+    if terms:
+        return "tokens", max(terms, key=len)
+    return "prefixes", prefix[:MAX_PREFIX]
+
+
+def score(weights: dict, terms: list, prefix: str | None) -> int:
+    # Every term has to match (0 otherwise). A complete word scores its
+    # weight; the prefix scores the best token it starts, doubled for an
+    # exact match
+    total = 0
+    for term in terms:
+        if term not in weights:
+            return 0
+        total += weights[term]
+    if prefix:
+        best = 0
+        for token, weight in weights.items():
+            if token == prefix:
+                best = max(best, 2 * weight)
+            elif token.startswith(prefix):
+                best = max(best, weight)
+        if not best:
+            return 0
+        total += best
+    return total
+
+
+def rank(candidates, terms: list, prefix: str | None) -> list:
+    # candidates: (collection, id, entry) triples. Returns result dicts, best
+    # first, ties broken by name
+    results = []
+    for collection, id, entry in candidates:
+        points = score(entry.get("weights") or {}, terms, prefix)
+        if points:
+            results.append(
+                {
+                    "collection": collection,
+                    "id": id,
+                    "name": entry.get("name"),
+                    "score": points,
+                }
+            )
+    results.sort(key=lambda result: (-result["score"], result["name"] or ""))
+    return results
@@ -0,0 +1,36 @@
+# JSON encoding for list responses.
+#
+# Documents are encoded straight from the snapshot dicts to bytes, without
+# building model objects first. orjson is used when it is installed and the
+# standard library encoder otherwise.
+
+import json
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+
+def dumps(obj) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj, default=str)
+    return json.dumps(obj, separators=(",", ":"), default=str).encode()
+
+
+def doc_to_json(doc) -> bytes:
+    # The id lives in the document key; the stored "id" field may be masked out
+    data = doc.to_dict()
+    data["id"] = doc.id
+    return dumps(data)
+
+
+def docs_to_json_array(docs) -> tuple[bytes, int, str]:
+    # Encode documents into one JSON array. Returns the body, the number of
+    # documents and the id of the last one
+    chunks = []
+    last_id = None
+    for doc in docs:
+        chunks.append(doc_to_json(doc))
+        last_id = doc.id
+    return b"[" + b",".join(chunks) + b"]", len(chunks), last_id
@@ -0,0 +1,31 @@
+# The functions source is deployed as a flat directory of modules, so the tests
+# import them the same way main.py does
+import os
+import sys
+
+import pytest
+
+sys.path.insert(
+    0,
+    os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "functions"
+    ),
+)
+
+
+@pytest.fixture
+def firestore(monkeypatch):
+    """An in-memory Firestore client behind db.get_client, with an empty entity
+    cache. Tests that use it need the firebase packages to import main"""
+    pytest.importorskip("firebase_functions")
+    import async_db
+    import db
+    from cache import entity_cache
+    from fake_firestore import AsyncClient, FakeClient
+
+    client = FakeClient()
+    monkeypatch.setattr(db, "_client", client)
+    monkeypatch.setattr(async_db, "_client", AsyncClient(client))
+    entity_cache.clear()
+    yield client
+    entity_cache.clear()
@@ -0,0 +1,376 @@
+# In-memory stand-in for the parts of the Firestore client that main.py uses:
+# document references and point reads, get_all, queries with equality, "in",
+# ">" and array_contains filters, ordering, cursors, projections and counts,
+# batches with last_update_time preconditions, transactions and BulkWriter.
+# Field transforms (SERVER_TIMESTAMP, Increment, DELETE_FIELD) and dotted field
+# paths are applied the way the server would. AsyncClient serves the same data
+# to async_db
+import itertools
+from datetime import datetime, timezone
+
+from google.api_core.exceptions import AlreadyExists, FailedPrecondition, NotFound
+from google.cloud.firestore_v1 import DELETE_FIELD, SERVER_TIMESTAMP, Increment
+
+ALREADY_EXISTS = 6
+NOT_FOUND = 5
+DOCUMENT_ID = "__name__"
+
+
+class Snapshot:
+    def __init__(self, reference, data: dict | None, update_time=None):
+        self.reference = reference
+        self.id = reference.id
+        self.exists = data is not None
+        self.update_time = update_time
+        self._data = data
+
+    def to_dict(self) -> dict | None:
+        return dict(self._data) if self._data is not None else None
+
+
+class DocumentReference:
+    def __init__(self, client, collection: str, id: str):
+        if "/" in id:
+            raise ValueError(f"Invalid document id: {id}")
+        self._client = client
+        self.id = id
+        self.path = f"{collection}/{id}"
+
+    def get(self, field_paths=None, transaction=None) -> Snapshot:
+        self._client.reads += 1
+        data, update_time = self._client.docs.get(self.path, (None, None))
+        return Snapshot(self, project(data, field_paths), update_time)
+
+    def set(self, data: dict, merge: bool = False) -> None:
+        self._client.write("set", self, data, merge=merge)
+
+    def update(self, data: dict) -> None:
+        if self.path not in self._client.docs:
+            raise NotFound(self.path)
+        self._client.write("update", self, data)
+
+
+class Query:
+    def __init__(self, client, collection: str, steps: tuple = ()):
+        self._client = client
+        self._collection = collection
+        self._steps = steps
+
+    def _with(self, *step) -> "Query":
+        return type(self)(self._client, self._collection, self._steps + (step,))
+
+    def where(self, field: str, op: str, value) -> "Query":
+        return self._with("where", field, op, value)
+
+    def order_by(self, field: str, direction: str = "ASCENDING") -> "Query":
+        return self._with("order_by", field, direction)
+
+    def start_after(self, values: dict) -> "Query":
+        return self._with("start_after", values)
+
+    def limit(self, count: int) -> "Query":
+        return self._with("limit", count)
+
+    def select(self, field_paths) -> "Query":
+        return self._with("select", list(field_paths))
+
+    def count(self) -> "CountQuery":
+        return CountQuery(self)
+
+    def stream(self, transaction=None):
+        docs = self._run()
+        self._client.reads += max(len(docs), 1)
+        return iter(docs)
+
+    def _run(self) -> list:
+        prefix = f"{self._collection}/"
+        docs = [
+            Snapshot(
+                DocumentReference(self._client, self._collection, path[len(prefix) :]),
+                data,
+                time,
+            )
+            for path, (data, time) in sorted(self._client.docs.items())
+            if path.startswith(prefix) and "/" not in path[len(prefix) :]
+        ]
+        orders, after, limit, fields = [], None, None, None
+        for kind, *args in self._steps:
+            if kind == "where":
+                docs = [doc for doc in docs if matches(doc, *args)]
+            elif kind == "order_by":
+                # Documents without the field are left out, as by the server
+                docs = [doc for doc in docs if matches(doc, args[0], "exists", None)]
+                orders.append(tuple(args))
+            elif kind == "start_after":
+                after = args[0]
+            elif kind == "limit":
+                limit = args[0]
+            else:
+                fields = args[0]
+        for field, direction in reversed(orders):
+            docs.sort(
+                key=lambda doc: value_of(doc, field), reverse=direction == "DESCENDING"
+            )
+        if after is not None:
+            key = [after[field] for field, _ in orders]
+            docs = [
+                doc
+                for doc in docs
+                if [value_of(doc, field) for field, _ in orders] > key
+            ]
+        docs = docs[:limit] if limit else docs
+        if fields is None:
+            return docs
+        return [
+            Snapshot(doc.reference, project(doc.to_dict(), fields), doc.update_time)
+            for doc in docs
+        ]
+
+
+class CountQuery:
+    def __init__(self, query: Query):
+        self._query = query
+
+    def get(self) -> list:
+        result = type("AggregationResult", (), {"value": len(self._query._run())})()
+        return [[result]]
+
+
+class CollectionReference(Query):
+    def __init__(self, client, name: str, steps: tuple = ()):
+        super().__init__(client, name, steps)
+        self.id = name
+
+    def _with(self, *step) -> Query:
+        return Query(self._client, self._collection, self._steps + (step,))
+
+    def document(self, id: str = None) -> DocumentReference:
+        return DocumentReference(self._client, self.id, id or next(self._client.ids))
+
+
+def value_of(doc: Snapshot, field: str):
+    return doc.id if field == DOCUMENT_ID else (doc.to_dict() or {}).get(field)
+
+
+def matches(doc: Snapshot, field: str, op: str, value) -> bool:
+    if field not in (doc.to_dict() or {}) and field != DOCUMENT_ID:
+        return False
+    actual = value_of(doc, field)
+    if op == "==":
+        return actual == value
+    if op == "in":
+        return actual in value
+    if op == ">":
+        return actual is not None and actual > value
+    if op == "exists":
+        return True
+    if op == "array_contains":
+        return value in (actual or [])
+    raise NotImplementedError(op)
+
+
+def project(data: dict | None, field_paths) -> dict | None:
+    if data is None or field_paths is None:
+        return data
+    return {field: data[field] for field in field_paths if field in data}
+
+
+class LastUpdateOption:
+    def __init__(self, last_update_time):
+        self.last_update_time = last_update_time
+
+
+class WriteBatch:
+    def __init__(self, client):
+        self._client = client
+        self._writes = []
+
+    def __len__(self) -> int:
+        return len(self._writes)
+
+    def set(self, ref, data: dict, merge: bool = False) -> None:
+        self._writes.append(("set", ref, data, merge, None))
+
+    def update(self, ref, data: dict, option=None) -> None:
+        self._writes.append(("update", ref, data, False, option))
+
+    def delete(self, ref) -> None:
+        self._writes.append(("delete", ref, None, False, None))
+
+    def commit(self) -> None:
+        # All or nothing, like the server
+        for method, ref, _, _, option in self._writes:
+            _, update_time = self._client.docs.get(ref.path, (None, None))
+            if method == "update" and update_time is None:
+                raise NotFound(ref.path)
+            if option and option.last_update_time != update_time:
+                raise FailedPrecondition(ref.path)
+        for method, ref, data, merge, _ in self._writes:
+            self._client.write(method, ref, data, merge=merge)
+
+
+class Transaction(WriteBatch):
+    # Just enough of firestore.Transaction for the transactional decorator.
+    # Reads are not isolated: tests run one transaction at a time
+    _read_only = False
+    _max_attempts = 1
+    _id = b"transaction"
+
+    def create(self, ref, data: dict) -> None:
+        self._writes.append(("create", ref, data, False, None))
+
+    def _clean_up(self) -> None:
+        self._writes = []
+
+    def _begin(self, retry_id=None) -> None:
+        pass
+
+    def _rollback(self) -> None:
+        self._writes = []
+
+    def _commit(self) -> list:
+        for method, ref, *_ in self._writes:
+            if method == "create" and ref.path in self._client.docs:
+                raise AlreadyExists(ref.path)
+        self.commit()
+        return []
+
+
+class BulkWriteFailure:
+    def __init__(self, ref, code: int, message: str):
+        self.code = code
+        self.message = message
+        self.attempts = 1
+        self.operation = type("Operation", (), {"reference": ref})()
+
+
+class BulkWriter:
+    def __init__(self, client):
+        self._client = client
+        self._on_error = None
+
+    def on_write_error(self, callback) -> None:
+        self._on_error = callback
+
+    def _run(self, method: str, ref, data: dict, merge: bool = False) -> None:
+        exists = ref.path in self._client.docs
+        if method == "create" and exists:
+            self._on_error(
+                BulkWriteFailure(ref, ALREADY_EXISTS, "ALREADY_EXISTS"), self
+            )
+        elif method == "update" and not exists:
+            self._on_error(BulkWriteFailure(ref, NOT_FOUND, "NOT_FOUND"), self)
+        else:
+            self._client.write(method, ref, data, merge=merge)
+
+    def create(self, ref, data: dict) -> None:
+        self._run("create", ref, data)
+
+    def set(self, ref, data: dict, merge: bool = False) -> None:
+        self._run("set", ref, data, merge)
+
+    def update(self, ref, data: dict) -> None:
+        self._run("update", ref, data)
+
+    def delete(self, ref) -> None:
+        self._run("delete", ref, None)
+
+    def close(self) -> None:
+        pass
+
+
+class FakeClient:
+    def __init__(self):
+        # path -> (data, update_time)
+        self.docs = {}
+        self.reads = 0
+        self.commits = 0
+        self._clock = itertools.count(1)
+        self.ids = (f"generated-{n}" for n in itertools.count(1))
+
+    def collection(self, name: str) -> CollectionReference:
+        return CollectionReference(self, name)
+
+    def get_all(self, refs, field_paths=None, transaction=None):
+        for ref in refs:
+            yield ref.get()
+
+    def batch(self) -> WriteBatch:
+        return WriteBatch(self)
+
+    def transaction(self) -> Transaction:
+        return Transaction(self)
+
+    def bulk_writer(self) -> BulkWriter:
+        return BulkWriter(self)
+
+    def write_option(self, last_update_time=None) -> LastUpdateOption:
+        return LastUpdateOption(last_update_time)
+
+    def data(self, path: str) -> dict | None:
+        return self.docs.get(path, (None, None))[0]
+
+    def put(self, path: str, data: dict) -> None:
+        self.docs[path] = (dict(data), next(self._clock))
+
+    def write(self, method: str, ref, data: dict | None, merge: bool = False) -> None:
+        self.commits += 1
+        if method == "delete":
+            self.docs.pop(ref.path, None)
+            return
+        current = self.data(ref.path) or {}
+        doc = {} if method in ("set", "create") and not merge else dict(current)
+        for key, value in data.items():
+            apply_field(
+                doc,
+                key.replace("`", "").split(".") if method == "update" else [key],
+                value,
+            )
+        self.docs[ref.path] = (doc, next(self._clock))
+
+
+def apply_field(doc: dict, path: list, value) -> None:
+    for key in path[:-1]:
+        doc = doc.setdefault(key, {})
+    if value is DELETE_FIELD:
+        doc.pop(path[-1], None)
+    elif value is SERVER_TIMESTAMP:
+        doc[path[-1]] = datetime.now(timezone.utc)
+    elif isinstance(value, Increment):
+        doc[path[-1]] = doc.get(path[-1], 0) + value.value
+    else:
+        doc[path[-1]] = value
+
+
+class AsyncClient:
+    """The async_db view of a FakeClient: the same documents behind coroutines
+    and async iterators"""
+
+    def __init__(self, client: FakeClient):
+        self._client = client
+
+    def collection(self, name: str) -> "AsyncQuery":
+        return AsyncQuery(self._client.collection(name))
+
+
+class AsyncQuery:
+    def __init__(self, query):
+        self._query = query
+
+    def __getattr__(self, name: str):
+        method = getattr(self._query, name)
+
+        def wrapped(*args, **kwargs):
+            result = method(*args, **kwargs)
+            if isinstance(result, (Query, DocumentReference, CountQuery)):
+                return AsyncQuery(result)
+            return result
+
+        return wrapped
+
+    async def get(self, *args, **kwargs):
+        return self._query.get(*args, **kwargs)
+
+    async def stream(self):
+        for doc in self._query.stream():
+            yield doc
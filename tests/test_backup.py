@@ -0,0 +1,68 @@
+import io
+import json
+
+import pytest
+
+from backup import decode_record, encode_record, gzip_chunks, read_lines
+from cache import CachedDocument
+from models import Epic, Story, Task
+
+MODELS = {"epics": Epic, "stories": Story, "tasks": Task}
+
+
+def story(id: str) -> CachedDocument:
+    return CachedDocument(
+        id,
+        {
+            "name": f"Story {id}",
+            "description": "",
+            "status": "Pending",
+            "epic_id": "e1",
+            "creator_id": "u1",
+            "assigned_user_id": None,
+            "due_date": None,
+            "created_at": "2026-10-16T00:00:00+00:00",
+            "updated_at": "2026-10-16T00:00:01+00:00",
+            "progress": {"total": 1},
+            "child_tasks": ["t1"],
+        },
+    )
+
+
+def test_round_trip_through_gzip():
+    lines = [encode_record("stories", story(str(n))) for n in range(2000)]
+    body = b"".join(gzip_chunks(iter(lines)))
+    assert body[:2] == b"\x1f\x8b"
+    decoded = list(read_lines(io.BytesIO(body), read_size=1000))
+    assert decoded == [line.rstrip(b"\n") for line in lines]
+
+
+def test_read_lines_accepts_plain_ndjson_without_trailing_newline():
+    body = b'{"a": 1}\n\n{"b": 2}'
+    assert list(read_lines(io.BytesIO(body), read_size=3)) == [
+        b'{"a": 1}',
+        b'{"b": 2}',
+    ]
+
+
+def test_records_leave_out_regenerated_and_legacy_fields():
+    record = json.loads(encode_record("stories", story("s1")))
+    assert record["collection"] == "stories" and record["id"] == "s1"
+    assert not {"updated_at", "progress", "child_tasks"} & set(record["data"])
+    collection, id, data = decode_record(encode_record("stories", story("s1")), MODELS)
+    assert (collection, id, data["id"]) == ("stories", "s1", "s1")
+
+
+@pytest.mark.parametrize(
+    "line",
+    [
+        b"not json",
+        b'{"collection": "stories"}',
+        b'{"collection": "users", "id": "u1", "data": {}}',
+        b'{"collection": "stories", "id": "a/b", "data": {}}',
+        b'{"collection": "stories", "id": "s1", "data": {"name": "x"}}',
+    ],
+)
+def test_decode_record_rejects_invalid_records(line):
+    with pytest.raises(ValueError):
+        decode_record(line, MODELS)
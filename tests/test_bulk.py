@@ -0,0 +1,86 @@
+import pytest
+
+main = pytest.importorskip("main")
+
+
+def epic(**fields) -> dict:
+    return {
+        "name": "Epic",
+        "description": "",
+        "creator_id": "u1",
+        "assigned_user_id": None,
+        "status": "Pending",
+        "due_date": "",
+        **fields,
+    }
+
+
+def story(**fields) -> dict:
+    return {**epic(name="Story", due_date=None), "epic_id": "e1", **fields}
+
+
+def test_upload_epics(firestore):
+    results = main.bulk_upload_items("epics", [epic(id="e1"), epic()])
+    assert [result["status"] for result in results] == ["ok", "ok"]
+    assert firestore.data("epics/e1")["name"] == "Epic"
+    assert firestore.data(f"epics/{results[1]['id']}")
+
+
+def test_upload_merges_into_existing_documents(firestore):
+    firestore.put(
+        "epics/e1", {**epic(), "created_at": "2026-01-01", "progress": {"n": 1}}
+    )
+    [result] = main.bulk_upload_items("epics", [epic(id="e1", name="Renamed")])
+    assert result["status"] == "ok"
+    stored = firestore.data("epics/e1")
+    assert stored["name"] == "Renamed"
+    assert stored["created_at"] == "2026-01-01"
+    assert stored["progress"] == {"n": 1}
+
+
+def test_upload_reports_bad_items_one_by_one(firestore):
+    firestore.put("epics/e1", epic())
+    results = main.bulk_upload_items(
+        "stories",
+        [
+            story(id="a/b"),
+            story(id="s1", epic_id="e/1"),
+            story(id="s2"),
+            story(id="s2"),
+            story(id="s3", epic_id="missing"),
+        ],
+    )
+    assert [result["status"] for result in results] == [
+        "error",
+        "error",
+        "ok",
+        "error",
+        "error",
+    ]
+    assert results[3]["error"] == "Duplicate id"
+    assert results[4]["error"] == "Parent not found"
+    assert firestore.data("stories/s2")
+
+
+def test_update_reports_bad_entries_one_by_one(firestore):
+    firestore.put("epics/e1", epic())
+    firestore.put("stories/s1", story())
+    results = main.bulk_update_items(
+        "stories",
+        [
+            {"id": "a/b", "data": {"name": "x"}},
+            {"id": "s1", "data": {"epic_id": "e/1"}},
+            {"id": "s1", "data": {"name": "First"}},
+            {"id": "s1", "data": {"name": "Second"}},
+            {"id": "missing", "data": {"name": "x"}},
+        ],
+    )
+    assert [result["status"] for result in results] == [
+        "error",
+        "error",
+        "ok",
+        "error",
+        "error",
+    ]
+    assert results[3]["error"] == "Duplicate id"
+    assert firestore.data("stories/s1")["name"] == "First"
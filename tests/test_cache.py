@@ -0,0 +1,40 @@
+from unittest import mock
+
+from cache import MISSING, CachedDocument, InMemoryBackend, TTLCache
+
+
+def test_lru_eviction_and_stats():
+    cache = TTLCache(max_size=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is MISSING
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.stats() == {"hits": 3, "misses": 1, "evictions": 1, "size": 2}
+
+
+def test_entries_expire_after_the_ttl():
+    cache = TTLCache(max_size=10, ttl=30)
+    with mock.patch("cache.time.monotonic", return_value=100.0):
+        cache.set("a", 1)
+    with mock.patch("cache.time.monotonic", return_value=131.0):
+        assert cache.get("a") is MISSING
+
+
+def test_shared_backend_fills_other_instances():
+    backend = InMemoryBackend()
+    first = TTLCache(max_size=10, ttl=60, backend=backend)
+    second = TTLCache(max_size=10, ttl=60, backend=backend)
+    first.set("epics/e1", {"name": "Epic"})
+    assert second.get("epics/e1") == {"name": "Epic"}
+    first.delete("epics/e1")
+    assert TTLCache(max_size=10, ttl=60, backend=backend).get("epics/e1") is MISSING
+
+
+def test_cached_document_projects_fields_and_copies_data():
+    doc = CachedDocument("t1", {"name": "Task", "status": "Pending"}, ["status"])
+    assert doc.exists and doc.id == "t1"
+    data = doc.to_dict()
+    data["status"] = "Completed"
+    assert doc.to_dict() == {"status": "Pending"}
@@ -0,0 +1,143 @@
+import json
+from urllib.parse import quote
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+
+main = pytest.importorskip("main")
+import flask  # noqa: E402
+from firebase_functions import https_fn  # noqa: E402
+from queries import QUERY_FILTERS  # noqa: E402
+
+T0 = datetime(2026, 10, 1, tzinfo=timezone.utc)
+
+
+def task(id: str, **fields) -> dict:
+    return {
+        "id": id,
+        "name": f"Task {id}",
+        "description": "",
+        "creator_id": "u1",
+        "assigned_user_id": "u2",
+        "status": "Pending",
+        "story_id": "s1",
+        "epic_id": "e1",
+        "due_date": None,
+        "created_at": "2026-10-01T00:00:00+00:00",
+        **fields,
+    }
+
+
+def list_tasks(query_string: str, headers: dict = None):
+    app = flask.Flask(__name__)
+    with app.test_request_context(f"/?{query_string}", headers=headers or {}):
+        query_params = {
+            field: flask.request.args.get(field) for field in QUERY_FILTERS["tasks"]
+        }
+        return main.list_response(flask.request, "tasks", query_params, main.Task)
+
+
+@pytest.fixture
+def tasks(firestore):
+    for n, status in enumerate(("Pending", "Completed", "Pending")):
+        id = f"t{n + 1}"
+        updated_at = T0 + timedelta(minutes=n)
+        firestore.put(
+            f"tasks/{id}", {**task(id, status=status), "updated_at": updated_at}
+        )
+    return firestore
+
+
+def test_list_filters_and_pages(tasks):
+    response = list_tasks("status=Pending&limit=1")
+    assert [item["id"] for item in json.loads(response.get_data())] == ["t1"]
+    assert response.headers["X-Next-Page-Token"] == "t1"
+    response = list_tasks("status=Pending&limit=1&page_token=t1")
+    assert [item["id"] for item in json.loads(response.get_data())] == ["t3"]
+
+
+def test_list_answers_304_for_a_matching_etag(tasks):
+    etag = list_tasks("status=Pending").get_etag()[0]
+    assert list_tasks("status=Pending", {"If-None-Match": etag}).status_code == 304
+    tasks.put("tasks/t4", {**task("t4"), "updated_at": T0 + timedelta(hours=1)})
+    assert list_tasks("status=Pending", {"If-None-Match": etag}).status_code == 200
+
+
+def test_since_returns_changes_oldest_first_and_the_next_token(tasks):
+    response = list_tasks(f"since={quote(T0.isoformat())}&limit=1")
+    assert [item["id"] for item in json.loads(response.get_data())] == ["t2"]
+    token = response.headers["X-Change-Token"]
+    response = list_tasks(f"since={quote(token)}")
+    assert [item["id"] for item in json.loads(response.get_data())] == ["t3"]
+
+
+@pytest.mark.parametrize("limit", ["x", "0", "100000"])
+def test_list_rejects_invalid_limits(tasks, limit):
+    with pytest.raises(https_fn.HttpsError):
+        list_tasks(f"limit={limit}")
+
+
+def snapshot(data: dict | None):
+    return SimpleNamespace(exists=data is not None, to_dict=lambda: data)
+
+
+def written(id: str, before: dict | None, after: dict | None, event_id: str):
+    data = SimpleNamespace(before=snapshot(before), after=snapshot(after))
+    return SimpleNamespace(id=event_id, params={"id": id}, data=data)
+
+
+def test_task_trigger_applies_rollups_once_per_event(firestore):
+    firestore.put("stories/s1", {"name": "Story"})
+    firestore.put("epics/e1", {"name": "Epic"})
+    firestore.put("tasks/t1", task("t1"))
+    on_task_written = main.on_task_written.__wrapped__
+    event = written("t1", None, task("t1"), "event-1")
+
+    on_task_written(event)
+    on_task_written(event)
+
+    for path in ("stories/s1", "epics/e1"):
+        assert firestore.data(path)["progress"] == {"total": 1, "Pending": 1}
+    assert "updated_at" not in firestore.data("stories/s1")
+    assert firestore.data("trigger_events/event-1")
+
+
+def test_story_trigger_points_tasks_at_the_new_epic(firestore):
+    firestore.put("stories/s1", {"name": "Story", "epic_id": "e2"})
+    firestore.put("tasks/t1", task("t1"))
+    firestore.put("tasks/t2", task("t2", story_id="s2"))
+    main.on_story_written.__wrapped__(
+        written("s1", {"epic_id": "e1"}, {"epic_id": "e2"}, "event-2")
+    )
+    assert firestore.data("tasks/t1")["epic_id"] == "e2"
+    assert firestore.data("tasks/t2")["epic_id"] == "e1"
+
+
+@pytest.mark.parametrize(
+    "job",
+    [
+        "repair_progress_rollups",
+        "backfill_task_epic_ids",
+        "migrate_child_id_arrays",
+        "rebuild_search_index",
+    ],
+)
+@pytest.mark.parametrize("limit", ["x", "0", "501"])
+def test_maintenance_jobs_reject_invalid_limits(firestore, job, limit):
+    app = flask.Flask(__name__)
+    path = f"/?collection=epics&limit={limit}"
+    with app.test_request_context(path, method="POST"):
+        with pytest.raises(https_fn.HttpsError):
+            getattr(main, job).__wrapped__(flask.request)
+
+
+@pytest.mark.parametrize(
+    "schedule", [{"pinned": "t1"}, {"pinned": [1]}, ["t1"]], ids=repr
+)
+def test_update_schedule_rejects_malformed_data_with_400(firestore, schedule):
+    app = flask.Flask(__name__)
+    path = "/?user_id=u2"
+    with app.test_request_context(path, method="POST", json={"schedule": schedule}):
+        response = main.update_schedule.__wrapped__(flask.request)
+    assert response.status_code == 400
@@ -0,0 +1,31 @@
+import importlib.util
+import os
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(scope="module")
+def generate_indexes():
+    path = os.path.join(ROOT, "tools", "generate_indexes.py")
+    spec = importlib.util.spec_from_file_location("generate_indexes", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_manifest_has_an_index_for_every_filter_combination(generate_indexes):
+    # A filter added to queries.QUERY_FILTERS needs its indexes generated
+    # with tools/generate_indexes.py
+    assert generate_indexes.missing_indexes(generate_indexes.load_manifest()) == []
+
+
+def test_required_indexes_fit_in_firestore_limit(generate_indexes):
+    assert generate_indexes.over_limit(generate_indexes.load_manifest()) == 0
+
+
+def test_a_sixth_task_filter_exceeds_the_limit(generate_indexes, monkeypatch):
+    filters = generate_indexes.QUERY_FILTERS
+    monkeypatch.setitem(filters, "tasks", filters["tasks"] + ("due_date",))
+    assert generate_indexes.over_limit(generate_indexes.load_manifest()) == 42
@@ -0,0 +1,25 @@
+import json
+import logging
+
+from instrumentation import instrumented, record
+
+
+@instrumented
+def read_two() -> str:
+    record(reads=2)
+    return "ok"
+
+
+@instrumented
+def handler() -> str:
+    record(queries=1)
+    return read_two()
+
+
+def test_request_is_logged_as_one_json_trace(caplog):
+    with caplog.at_level(logging.INFO, logger="instrumentation"):
+        assert handler() == "ok"
+    [entry] = [json.loads(r.getMessage()) for r in caplog.records]
+    assert entry["message"] == "trace handler"
+    assert (entry["reads"], entry["queries"], entry["writes"]) == (2, 1, 0)
+    assert entry["spans"]["read_two"]["calls"] == 1
@@ -0,0 +1,70 @@
+import pytest
+
+from models import Epic, Story, Task, validate_update
+
+
+def task_data(**fields) -> dict:
+    return {
+        "name": "Write tests",
+        "description": "",
+        "status": "Pending",
+        "story_id": "story-1",
+        "creator_id": "user-1",
+        "assigned_user_id": None,
+        "due_date": None,
+        **fields,
+    }
+
+
+def test_validate_update_returns_valid_update_unchanged():
+    update = {"status": "Completed", "due_date": "2026-10-20T00:00:00+00:00"}
+    assert validate_update(Task, update) is update
+
+
+@pytest.mark.parametrize(
+    "update",
+    [
+        {},
+        {"id": "other"},
+        {"created_at": "2026-01-01T00:00:00+00:00"},
+        {"child_tasks": []},
+        {"status": "Done"},
+        {"status": ["Pending"]},
+        {"due_date": "tomorrow"},
+        {"name": 3},
+        {"creator_id": None},
+        {"story_id": ["story-1"]},
+        {"story_id": "stories/story-1"},
+    ],
+)
+def test_validate_update_rejects(update):
+    with pytest.raises(ValueError):
+        validate_update(Task, update)
+
+
+def test_validate_update_applies_each_models_due_date_rule():
+    # Epics store "" for no due date, stories and tasks None
+    assert validate_update(Epic, {"due_date": ""}) == {"due_date": ""}
+    assert validate_update(Story, {"due_date": None}) == {"due_date": None}
+    with pytest.raises(ValueError):
+        validate_update(Epic, {"due_date": None})
+    with pytest.raises(ValueError):
+        validate_update(Task, {"due_date": ""})
+
+
+def test_validate_update_allows_clearing_optional_ids():
+    assert validate_update(Task, {"assigned_user_id": None, "story_id": None})
+
+
+def test_from_dict_rejects_non_string_ids():
+    with pytest.raises(ValueError):
+        Task.from_dict(task_data(story_id=["story-1"]))
+    with pytest.raises(ValueError):
+        Task.from_dict(task_data(), id=7)
+
+
+def test_from_dict_requires_every_field():
+    data = task_data()
+    del data["status"]
+    with pytest.raises(ValueError, match="status"):
+        Task.from_dict(data)
@@ -0,0 +1,54 @@
+import pytest
+
+main = pytest.importorskip("main")
+
+
+def task(**fields) -> dict:
+    return {
+        "id": "t1",
+        "name": "Task",
+        "description": "",
+        "creator_id": "u1",
+        "assigned_user_id": None,
+        "status": "Pending",
+        "story_id": "s1",
+        "epic_id": "e1",
+        "due_date": None,
+        "created_at": "2026-01-01T00:00:00+00:00",
+        **fields,
+    }
+
+
+def test_patch_merges_the_update_into_the_stored_task(firestore):
+    firestore.put("tasks/t1", task())
+    item = main.patch_task_in_db_with_fields("t1", {"status": "Completed"})
+    assert (item.status, item.name) == ("Completed", "Task")
+    assert firestore.data("tasks/t1")["status"] == "Completed"
+    assert firestore.reads == 1
+
+
+def test_patch_retries_when_the_task_changed_after_the_read(firestore, monkeypatch):
+    firestore.put("tasks/t1", task())
+    write_option = firestore.write_option
+
+    def stale_once(last_update_time=None):
+        monkeypatch.setattr(firestore, "write_option", write_option)
+        firestore.put("tasks/t1", task(name="Renamed"))
+        return write_option(last_update_time)
+
+    monkeypatch.setattr(firestore, "write_option", stale_once)
+    item = main.patch_task_in_db_with_fields("t1", {"status": "Completed"})
+    assert (item.status, item.name) == ("Completed", "Renamed")
+    assert firestore.reads == 2
+
+
+def test_patch_of_a_missing_task_raises_not_found(firestore):
+    with pytest.raises(main.DocumentNotFound):
+        main.patch_task_in_db_with_fields("missing", {"status": "Completed"})
+
+
+def test_patch_moves_the_task_to_the_story_epic(firestore):
+    firestore.put("tasks/t1", task())
+    firestore.put("stories/s2", {"epic_id": "e2"})
+    item = main.patch_task_in_db_with_fields("t1", {"story_id": "s2"})
+    assert (item.story_id, item.epic_id) == ("s2", "e2")
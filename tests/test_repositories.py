@@ -0,0 +1,58 @@
+import pytest
+
+from repositories import MemoryBackend, get_repo, use_backend
+
+
+@pytest.fixture
+def backend():
+    backend = MemoryBackend()
+    use_backend(backend)
+    yield backend
+    use_backend(None)
+
+
+def test_get_and_get_many(backend):
+    backend.set("tasks", "t1", {"name": "Task t1"})
+    tasks = get_repo("tasks")
+    assert tasks.get("t1").to_dict() == {"name": "Task t1"}
+    assert tasks.get("t1", ["status"]).to_dict() == {}
+    assert tasks.get("missing") is None
+    assert [doc.id for doc in tasks.get_many(["t1", "missing", "t1"])] == ["t1"]
+
+
+def test_collections_are_separate(backend):
+    backend.set("epics", "e1", {"name": "Epic"})
+    assert get_repo("epics").get("e1").to_dict() == {"name": "Epic"}
+    assert get_repo("tasks").get("e1") is None
+
+
+def test_uncached_get_reads_firestore(monkeypatch):
+    import repositories
+    from cache import entity_cache, entity_key
+
+    class Snapshot:
+        exists = True
+
+        def to_dict(self):
+            return {"epic_id": "e2"}
+
+    class Client:
+        def collection(self, name):
+            return self
+
+        def document(self, id):
+            return self
+
+        def get(self):
+            return Snapshot()
+
+    monkeypatch.setattr(repositories, "get_client", Client)
+    backend = repositories.FirestoreBackend()
+    entity_cache.set(entity_key("stories", "s1"), {"epic_id": "e1"})
+    try:
+        assert backend.get("stories", "s1").to_dict() == {"epic_id": "e1"}
+        fresh = backend.get("stories", "s1", use_cache=False)
+        assert fresh.to_dict() == {"epic_id": "e2"}
+        assert backend.get("stories", "s1").to_dict() == {"epic_id": "e2"}
+    finally:
+        entity_cache.delete(entity_key("stories", "s1"))
@@ -0,0 +1,28 @@
+import pytest
+
+main = pytest.importorskip("main")
+from rollups import task_deltas  # noqa: E402
+
+
+def test_rollup_writes_increment_progress(firestore):
+    firestore.put("stories/s1", {"name": "Story"})
+    task = {"status": "In Progress", "due_date": None, "story_id": "s1"}
+
+    errors = main.run_bulk_writes(main.rollup_writes(task_deltas(None, task)))
+
+    assert errors == {}
+    assert firestore.data("stories/s1")["progress"]["In Progress"] == 1
+
+
+def test_unstamped_rollup_writes_leave_updated_at_alone(firestore):
+    # Progress is not in the list responses, so bumping updated_at would
+    # change the parents' ETags and since= results for nothing
+    firestore.put("stories/s1", {"name": "Story", "updated_at": "then"})
+    firestore.put("epics/e1", {"name": "Epic", "updated_at": "then"})
+    task = {"status": "Pending", "due_date": None, "story_id": "s1", "epic_id": "e1"}
+    writes = main.rollup_writes(task_deltas(None, task))
+
+    assert main.run_bulk_writes(writes, stamp=False) == {}
+    for path in ("stories/s1", "epics/e1"):
+        assert firestore.data(path)["updated_at"] == "then"
+        assert firestore.data(path)["progress"]["Pending"] == 1
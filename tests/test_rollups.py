@@ -0,0 +1,80 @@
+from datetime import datetime, timezone
+
+from rollups import build_progress, due_day, nonzero, summarize, task_deltas
+
+
+def task(status="Pending", due_date=None, story_id="s1", epic_id="e1") -> dict:
+    return {
+        "status": status,
+        "due_date": due_date,
+        "story_id": story_id,
+        "epic_id": epic_id,
+    }
+
+
+def test_due_day_is_the_utc_day():
+    assert due_day("2026-10-16T23:30:00-02:00") == "2026-10-17"
+    assert due_day("2026-10-16T10:00:00") == "2026-10-16"
+    assert due_day("") is None
+    assert due_day("soon") is None
+
+
+def test_new_task_counts_towards_story_and_epic():
+    deltas = nonzero(task_deltas(None, task(due_date="2026-10-20T00:00:00+00:00")))
+    expected = {("total",): 1, ("Pending",): 1, ("open_due", "2026-10-20"): 1}
+    assert deltas == {("stories", "s1"): expected, ("epics", "e1"): expected}
+
+
+def test_status_change_moves_counts():
+    deltas = nonzero(task_deltas(task(), task(status="Completed")))
+    assert deltas[("stories", "s1")] == {("Pending",): -1, ("Completed",): 1}
+
+
+def test_completed_tasks_leave_the_open_due_buckets():
+    old = task(due_date="2026-10-20T00:00:00+00:00")
+    deltas = nonzero(task_deltas(old, {**old, "status": "Completed"}))
+    assert deltas[("epics", "e1")] == {
+        ("Pending",): -1,
+        ("Completed",): 1,
+        ("open_due", "2026-10-20"): -1,
+    }
+
+
+def test_move_between_parents():
+    deltas = nonzero(task_deltas(task(), task(story_id="s2", epic_id="e2")))
+    assert deltas[("stories", "s1")] == {("total",): -1, ("Pending",): -1}
+    assert deltas[("epics", "e2")] == {("total",): 1, ("Pending",): 1}
+
+
+def test_unchanged_task_has_no_deltas():
+    assert nonzero(task_deltas(task(), task())) == {}
+
+
+def test_deltas_sum_to_the_rebuilt_rollup():
+    tasks = [
+        task(due_date="2026-10-10T00:00:00+00:00"),
+        task(status="In Progress"),
+        task(status="Completed", due_date="2026-10-10T00:00:00+00:00"),
+    ]
+    deltas = None
+    for item in tasks:
+        deltas = task_deltas(None, item, deltas)
+    progress = build_progress(tasks)
+    for path, count in deltas[("stories", "s1")].items():
+        value = progress
+        for key in path:
+            value = value[key]
+        assert value == count
+
+
+def test_summarize_counts_overdue_before_today():
+    progress = {
+        "total": 3,
+        "Pending": 3,
+        "open_due": {"2026-10-15": 2, "2026-10-16": 1},
+    }
+    now = datetime(2026, 10, 16, 12, tzinfo=timezone.utc)
+    summary = summarize(progress, now)
+    assert summary["overdue"] == 2
+    assert summary["counts"] == {"Completed": 0, "In Progress": 0, "Pending": 3}
+    assert summarize(None, now)["total"] == 0
@@ -0,0 +1,69 @@
+from datetime import datetime, timezone
+
+from schedule import apply_change, build_items, day_plan, entry_from_task
+
+NOW = datetime(2026, 10, 16, 12, tzinfo=timezone.utc)
+
+
+def entry(id, status="Pending", due_date=None, created_at="2026-01-01"):
+    return entry_from_task(
+        {
+            "id": id,
+            "name": id,
+            "status": status,
+            "due_date": due_date,
+            "assigned_user_id": "u1",
+            "created_at": created_at,
+        },
+        "u1",
+    )
+
+
+def test_entry_only_for_open_tasks_of_the_user():
+    assert entry("t1")["due_utc"] is None
+    assert entry("t1", status="Completed") is None
+    assert entry_from_task({"id": "t1", "status": "Pending"}, "u1") is None
+    assert entry_from_task(None, "u1") is None
+
+
+def test_build_items_orders_by_due_date_then_status_then_age():
+    items, truncated = build_items(
+        [
+            entry("no-due"),
+            entry("later", due_date="2026-10-20T00:00:00+00:00"),
+            entry("soon-pending", due_date="2026-10-17T00:00:00+00:00"),
+            entry(
+                "soon-started", status="In Progress", due_date="2026-10-17T00:00:00Z"
+            ),
+        ]
+    )
+    assert [item["id"] for item in items] == [
+        "soon-started",
+        "soon-pending",
+        "later",
+        "no-due",
+    ]
+    assert not truncated
+
+
+def test_apply_change_replaces_and_removes_entries():
+    items, _ = build_items([entry("a"), entry("b", due_date="2026-10-20T00:00:00Z")])
+    items = apply_change(items, "a", entry("a", due_date="2026-10-18T00:00:00Z"))
+    assert [item["id"] for item in items] == ["a", "b"]
+    assert [item["id"] for item in apply_change(items, "a", None)] == ["b"]
+
+
+def test_day_plan_puts_pinned_tasks_first():
+    items, _ = build_items(
+        [
+            entry("overdue", due_date="2026-10-15T00:00:00Z"),
+            entry("today", due_date="2026-10-16T18:00:00Z"),
+            entry("upcoming", due_date="2026-10-19T00:00:00Z"),
+            entry("pinned"),
+        ]
+    )
+    plan = day_plan(items, ["pinned", "unknown"], NOW)
+    assert plan["date"] == "2026-10-16"
+    assert [item["id"] for item in plan["overdue"]] == ["overdue"]
+    assert [item["id"] for item in plan["today"]] == ["pinned", "today"]
+    assert [item["id"] for item in plan["upcoming"]] == ["upcoming"]
@@ -0,0 +1,44 @@
+from search import MAX_PREFIX, index_entry, parse_query, rank, tokenize
+
+
+def test_tokenize_lowercases_and_strips_accents():
+    assert tokenize("Café au LAIT, déjà-vu!") == ["cafe", "au", "lait", "deja", "vu"]
+    assert tokenize(None) == []
+
+
+def test_index_entry_weights_names_over_descriptions():
+    entry = index_entry({"name": "Login bug", "description": "login fails"})
+    assert entry["weights"] == {"login": 4, "bug": 3, "fails": 1}
+    assert entry["tokens"] == ["bug", "fails", "login"]
+    assert "lo" in entry["prefixes"] and "l" not in entry["prefixes"]
+    long_word = index_entry({"name": "x" * 40})
+    assert max(map(len, long_word["prefixes"])) == MAX_PREFIX
+
+
+def test_parse_query_treats_the_last_word_as_a_prefix_while_typing():
+    assert parse_query("login bu") == (["login"], "bu")
+    assert parse_query("login bug ") == (["login", "bug"], None)
+    assert parse_query("") == ([], None)
+
+
+def test_rank_requires_every_term_and_orders_by_score():
+    candidates = [
+        ("tasks", "t1", index_entry({"name": "Fix login", "description": ""})),
+        ("tasks", "t2", index_entry({"name": "Docs", "description": "login page"})),
+        ("tasks", "t3", index_entry({"name": "Fix signup", "description": ""})),
+    ]
+    results = rank(candidates, ["login"], None)
+    assert [result["id"] for result in results] == ["t1", "t2"]
+    assert results[0]["score"] == 3
+
+
+def test_rank_doubles_exact_prefix_matches():
+    candidates = [
+        ("epics", "e1", index_entry({"name": "bug", "description": ""})),
+        ("epics", "e2", index_entry({"name": "bugs", "description": ""})),
+    ]
+    results = rank(candidates, [], "bug")
+    assert [(result["id"], result["score"]) for result in results] == [
+        ("e1", 6),
+        ("e2", 3),
+    ]
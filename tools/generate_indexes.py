@@ -0,0 +1,127 @@
+"""Generate the composite indexes in firestore.indexes.json.
+
+Every combination of two or more equality filters in queries.QUERY_FILTERS gets
+a composite index, so the list queries (including their document id ordering
+for pagination) are served from a single index instead of a merge-join. Every
+non-empty combination also gets one ending in updated_at descending, used by the
+ETag version lookup, and one ending in updated_at ascending, used by the since=
+change queries.
+
+The number of indexes grows exponentially with the filters of a collection:
+tasks, with five filters, need 88, and every task write updates an entry in
+each of them. A database can hold at most MAX_COMPOSITE_INDEXES composite
+indexes, so both modes fail once the required set exceeds it. A sixth task
+filter would bring the total from 147 to 242. Avoid that by giving the new
+filter its own endpoint, or by dropping a filter combination nobody uses.
+
+    python tools/generate_indexes.py          # rewrite firestore.indexes.json
+    python tools/generate_indexes.py --check  # exit 1 if an index is missing
+"""
+
+import argparse
+import json
+import os
+import sys
+from itertools import combinations
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+INDEXES_PATH = os.path.join(ROOT, "firestore.indexes.json")
+sys.path.insert(0, os.path.join(ROOT, "functions"))
+
+from db import UPDATED_AT  # noqa: E402
+from queries import QUERY_FILTERS  # noqa: E402
+
+# Firestore's limit on composite indexes per database
+MAX_COMPOSITE_INDEXES = 200
+
+
+def composite_index(
+    collection: str, fields: tuple, order_by: str = None, direction: str = None
+) -> dict:
+    index_fields = [{"fieldPath": field, "order": "ASCENDING"} for field in fields]
+    if order_by:
+        index_fields.append({"fieldPath": order_by, "order": direction})
+    return {
+        "collectionGroup": collection,
+        "queryScope": "COLLECTION",
+        "fields": index_fields,
+    }
+
+
+def required_indexes() -> list:
+    indexes = []
+    for collection, fields in QUERY_FILTERS.items():
+        for size in range(1, len(fields) + 1):
+            for combination in combinations(fields, size):
+                if size > 1:
+                    indexes.append(composite_index(collection, combination))
+                for direction in ("DESCENDING", "ASCENDING"):
+                    indexes.append(
+                        composite_index(collection, combination, UPDATED_AT, direction)
+                    )
+    return indexes
+
+
+def index_key(index: dict) -> tuple:
+    # Equality filters can be served by an index regardless of field order
+    return (
+        index["collectionGroup"],
+        index.get("queryScope", "COLLECTION"),
+        frozenset(
+            (field["fieldPath"], field.get("order"), field.get("arrayConfig"))
+            for field in index["fields"]
+        ),
+    )
+
+
+def load_manifest() -> dict:
+    with open(INDEXES_PATH) as f:
+        return json.load(f)
+
+
+def missing_indexes(manifest: dict) -> list:
+    existing = {index_key(index) for index in manifest.get("indexes", [])}
+    return [index for index in required_indexes() if index_key(index) not in existing]
+
+
+def over_limit(manifest: dict) -> int:
+    # Number of composite indexes beyond MAX_COMPOSITE_INDEXES once the missing
+    # ones are added, 0 when they fit
+    total = len(manifest.get("indexes", [])) + len(missing_indexes(manifest))
+    return max(total - MAX_COMPOSITE_INDEXES, 0)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--check", action="store_true", help="fail if an index is missing"
+    )
+    args = parser.parse_args()
+
+    manifest = load_manifest()
+    excess = over_limit(manifest)
+    if excess:
+        print(
+            f"The filters in queries.QUERY_FILTERS need {excess} composite indexes"
+            f" more than Firestore's limit of {MAX_COMPOSITE_INDEXES}"
+        )
+        return 1
+    missing = missing_indexes(manifest)
+    if args.check:
+        for index in missing:
+            fields = ", ".join(field["fieldPath"] for field in index["fields"])
+            print(f"Missing index on {index['collectionGroup']}: {fields}")
+        return 1 if missing else 0
+
+    # Keep indexes that were added by hand and append the missing ones
+    manifest["indexes"] = manifest.get("indexes", []) + missing
+    manifest.setdefault("fieldOverrides", [])
+    with open(INDEXES_PATH, "w") as f:
+        json.dump(manifest, f, indent=2)
+        f.write("\n")
+    print(f"Added {len(missing)} indexes to {INDEXES_PATH}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
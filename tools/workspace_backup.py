@@ -0,0 +1,54 @@
+"""Export a workspace to a backup file, or import one.
+
+Uses the same format and code as the export_workspace and import_workspace
+functions, without the request size limit of an HTTP call. Credentials come
+from the environment, as for any firebase_admin script.
+
+    python tools/workspace_backup.py export backup.ndjson.gz
+    python tools/workspace_backup.py export team.ndjson.gz --creator-id <uid>
+    python tools/workspace_backup.py import backup.ndjson.gz
+"""
+
+import argparse
+import json
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "functions"))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("command", choices=("export", "import"))
+    parser.add_argument("path")
+    parser.add_argument("--epic-ids", default="", help="comma separated epic ids")
+    parser.add_argument("--creator-id")
+    parser.add_argument("--assigned-user-id")
+    args = parser.parse_args()
+
+    import main as functions
+    from backup import gzip_chunks, read_lines
+
+    if args.command == "export":
+        records = functions.export_records(
+            [id for id in args.epic_ids.split(",") if id],
+            {
+                "creator_id": args.creator_id,
+                "assigned_user_id": args.assigned_user_id,
+            },
+        )
+        with open(args.path, "wb") as f:
+            for chunk in gzip_chunks(records):
+                f.write(chunk)
+        print(f"Exported to {args.path}")
+        return 0
+
+    with open(args.path, "rb") as f:
+        result = functions.import_records(read_lines(f))
+    print(json.dumps(result, indent=2))
+    return 1 if result["error_count"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())